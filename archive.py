@@ -0,0 +1,75 @@
+import io
+import json
+import os
+import tarfile
+import tempfile
+import time
+import zipfile
+
+MANIFEST_NAME = "manifest.json"
+
+class ArchiveWriter:
+    """Append encoded sheets to a .zip or .tar (.tar.gz, .tgz) archive as they are rendered.
+
+    Members are written straight into the archive, with no intermediate files. The manifest
+    entries are spooled to a temporary file and added as manifest.json when the archive is
+    closed, so memory use does not depend on the number of sheets.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._names = set()
+        lower = path.lower()
+        if lower.endswith(".zip"):
+            # Sheets are already compressed images, deflating them again gains nothing
+            self._zip = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED, allowZip64=True)
+            self._tar = None
+        elif lower.endswith((".tar", ".tar.gz", ".tgz")):
+            mode = "w" if lower.endswith(".tar") else "w:gz"
+            self._tar = tarfile.open(path, mode)
+            self._zip = None
+        else:
+            raise ValueError(f"Unsupported archive {path}, expected a .zip, .tar or .tar.gz file")
+        self._manifest = tempfile.TemporaryFile("w+", encoding="utf-8")
+
+    def _unique_name(self, name):
+        # Ships sharing a title would overwrite each other in a directory; keep both in the archive
+        base, extension = os.path.splitext(name)
+        unique, number = name, 1
+        while unique in self._names:
+            number += 1
+            unique = f"{base}_{number}{extension}"
+        self._names.add(unique)
+        return unique
+
+    def _write_member(self, name, data):
+        if self._zip is not None:
+            self._zip.writestr(zipfile.ZipInfo(name, time.localtime()[:6]), data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self._tar.addfile(info, io.BytesIO(data))
+
+    def add(self, name, data, **details):
+        """Append a sheet under name, recording its size and details (title, source, hashes) in the manifest."""
+        name = self._unique_name(name)
+        self._write_member(name, data)
+        entry = {"name": name, "bytes": len(data)}
+        entry.update(details)
+        self._manifest.write(json.dumps(entry, sort_keys=True) + "\n")
+        self.count += 1
+        return name
+
+    def close(self):
+        """Write manifest.json and close the archive."""
+        self._manifest.seek(0)
+        entries = (line.rstrip("\n") for line in self._manifest)
+        manifest = "[\n" + ",\n".join(entries) + "\n]\n" if self.count else "[]\n"
+        self._write_member(MANIFEST_NAME, manifest.encode("utf-8"))
+        self._manifest.close()
+        if self._zip is not None:
+            self._zip.close()
+        else:
+            self._tar.close()
@@ -0,0 +1,123 @@
+import hashlib
+import os
+import threading
+from PIL import Image, ImageFont
+from tracing import span
+
+# Process-wide registry of loaded fonts and pre-scaled icons.
+# Entries are keyed by (path, size, resample, mode) and are shared between callers,
+# so the returned objects must be treated as read-only.
+_lock = threading.Lock()
+_fonts = {}
+_icons = {}
+_fingerprints = {}
+_icon_sizes = {}
+
+def get_font(path, size):
+    """Return the TrueType font at path with the given size, loading it once per process."""
+    key = (path, size, None, None)
+    with _lock:
+        font = _fonts.get(key)
+    if font is not None:
+        return font
+
+    with span("load_font", "assets", path=path, size=size):
+        font = ImageFont.truetype(path, size)
+
+    with _lock:
+        # Another thread may have loaded the same entry meanwhile, keep the first one
+        return _fonts.setdefault(key, font)
+
+def get_icon(path, size=None, resample=Image.Resampling.LANCZOS, mode=None):
+    """Return the icon at path resized to size (an int for square icons or a (w, h) tuple).
+
+    With size=None the icon is returned at its original resolution. With a mode (such as "LA"
+    for grayscale sheets) the original is converted once and every size is scaled from it.
+    """
+    if isinstance(size, int):
+        size = (size, size)
+    key = (path, size, resample, mode)
+    with _lock:
+        icon = _icons.get(key)
+    if icon is not None:
+        return icon
+
+    if size is None and mode is not None:
+        original = get_icon(path)
+        with span("convert_icon", "assets", path=path, mode=mode):
+            icon = original.convert(mode)
+    elif size is None:
+        with span("load_icon", "assets", path=path):
+            icon = Image.open(path)
+            icon.load()
+    else:
+        original = get_icon(path, mode=mode)
+        with span("resize_icon", "assets", path=path, size=list(size)):
+            icon = original.resize(size, resample)
+
+    with _lock:
+        # Another thread may have loaded the same entry meanwhile, keep the first one
+        return _icons.setdefault(key, icon)
+
+def icon_size(path):
+    """Return the original (width, height) of the icon at path, reading only the image header."""
+    with _lock:
+        size = _icon_sizes.get(path)
+    if size is None:
+        with Image.open(path) as img:
+            size = img.size
+        with _lock:
+            _icon_sizes[path] = size
+    return size
+
+def icon_size_by_height(path, height):
+    """Return the (width, height) of the icon at path scaled to height, maintaining its aspect ratio."""
+    width, original_height = icon_size(path)
+    aspect_ratio = width / original_height
+    return int(height * aspect_ratio), height
+
+def get_icon_by_height(path, height, resample=Image.Resampling.LANCZOS, mode=None):
+    """Return the icon at path resized to the given height, maintaining its aspect ratio."""
+    return get_icon(path, icon_size_by_height(path, height), resample, mode)
+
+def warm(fonts=(), icons=(), mode=None):
+    """Preload fonts given as (path, size) pairs and icons given as (path, size) pairs, converted to mode if given."""
+    for path, size in fonts:
+        get_font(path, size)
+    for path, size in icons:
+        get_icon(path, size, mode=mode)
+
+def clear():
+    """Drop every cached font, icon and asset fingerprint."""
+    with _lock:
+        _fonts.clear()
+        _icons.clear()
+        _fingerprints.clear()
+        _icon_sizes.clear()
+
+def stats():
+    """Return the number of cached fonts and icons."""
+    with _lock:
+        return {"fonts": len(_fonts), "icons": len(_icons)}
+
+def asset_fingerprint(directories=("fonts", "resources")):
+    """Return a hash of every file in the given asset directories, computed once per process."""
+    key = tuple(directories)
+    with _lock:
+        fingerprint = _fingerprints.get(key)
+    if fingerprint is not None:
+        return fingerprint
+
+    digest = hashlib.sha256()
+    for directory in directories:
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if not os.path.isfile(path):
+                continue
+            digest.update(path.encode("utf-8"))
+            with open(path, "rb") as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+    fingerprint = digest.hexdigest()
+
+    with _lock:
+        return _fingerprints.setdefault(key, fingerprint)
@@ -0,0 +1,130 @@
+import json
+import os
+from PIL import Image
+
+ATLAS_SIZE = 4096  # Width and height of an atlas page, the largest texture size supported nearly everywhere
+ATLAS_PADDING = 2  # Blank pixels between packed tiles, so texture filtering never bleeds into a neighbour
+INDEX_NAME = "atlas.json"
+
+class MaxRectsPacker:
+    """Pack rectangles into a fixed-size bin with the MaxRects algorithm (best short side fit).
+
+    The free space is kept as a list of maximal free rectangles, which may overlap. Each
+    rectangle goes in the free rectangle where it leaves the smallest leftover side, then every
+    free rectangle it overlaps is split and the ones contained in another are dropped.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.free = [(0, 0, width, height)]
+        self.used_area = 0
+
+    def find(self, width, height):
+        """Return the best (x, y) for a width x height rectangle, or None when it does not fit."""
+        best = None
+        best_score = None
+        for x, y, free_w, free_h in self.free:
+            if width <= free_w and height <= free_h:
+                leftover_w, leftover_h = free_w - width, free_h - height
+                score = (min(leftover_w, leftover_h), max(leftover_w, leftover_h))
+                if best_score is None or score < best_score:
+                    best, best_score = (x, y), score
+        return best
+
+    def insert(self, width, height):
+        """Place a width x height rectangle and return its (x, y), or None when it does not fit."""
+        position = self.find(width, height)
+        if position is None:
+            return None
+        placed = (position[0], position[1], width, height)
+        free = []
+        for rect in self.free:
+            free.extend(_split(rect, placed) if _intersects(rect, placed) else [rect])
+        # Drop free rectangles contained in another one
+        self.free = [rect for i, rect in enumerate(free)
+                     if not any(j != i and _contains(other, rect) and (other != rect or j < i) for j, other in enumerate(free))]
+        self.used_area += width * height
+        return position
+
+    def occupancy(self):
+        """Return the fraction of the bin covered by placed rectangles."""
+        return self.used_area / (self.width * self.height)
+
+def _intersects(a, b):
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+def _contains(outer, inner):
+    return (outer[0] <= inner[0] and outer[1] <= inner[1] and
+            inner[0] + inner[2] <= outer[0] + outer[2] and inner[1] + inner[3] <= outer[1] + outer[3])
+
+def _split(free, used):
+    """Return the parts of a free rectangle left around a used one that overlaps it."""
+    x, y, w, h = free
+    ux, uy, uw, uh = used
+    parts = []
+    if ux > x:
+        parts.append((x, y, ux - x, h))
+    if ux + uw < x + w:
+        parts.append((ux + uw, y, x + w - ux - uw, h))
+    if uy > y:
+        parts.append((x, y, w, uy - y))
+    if uy + uh < y + h:
+        parts.append((x, uy + uh, w, y + h - uy - uh))
+    return parts
+
+def pack(sizes, page_size=ATLAS_SIZE, padding=ATLAS_PADDING):
+    """Pack (width, height) sizes onto as few page_size x page_size pages as it takes.
+
+    Rectangles are placed largest first, which packs much tighter than input order. Returns
+    a list with the (page, x, y) of each size, in input order, and the packers of the pages.
+    """
+    order = sorted(range(len(sizes)), key=lambda i: (sizes[i][1], sizes[i][0]), reverse=True)
+    pages = []
+    placements = [None] * len(sizes)
+    for i in order:
+        width, height = sizes[i]
+        if width + padding > page_size or height + padding > page_size:
+            raise ValueError(f"Tile of {width}x{height}px does not fit on a {page_size}x{page_size}px atlas page")
+        for page, packer in enumerate(pages):
+            position = packer.insert(width + padding, height + padding)
+            if position is not None:
+                break
+        else:
+            pages.append(MaxRectsPacker(page_size, page_size))
+            page = len(pages) - 1
+            position = pages[page].insert(width + padding, height + padding)
+        placements[i] = (page, position[0], position[1])
+    return placements, pages
+
+def write_atlas(tiles, entries, output_dir, render, page_size=ATLAS_SIZE, padding=ATLAS_PADDING, mode="RGBA"):
+    """Pack distinct tiles into PNG atlas pages in output_dir and write their JSON index.
+
+    tiles is a list of (name, laid out tile box), entries a list of dicts (ship, section, system)
+    each with the "tile" index of its tile, so entries with identical systems share one slot;
+    the page and rect of that slot are added to them.
+    render(tile box) returns the tile image. Pages are drawn one at a time, rendering only the
+    tiles of that page, so memory holds a single page whatever the number of tiles. Pages are
+    transparent images of the given mode, RGBA or LA for grayscale tiles.
+    """
+    placements, packers = pack([(tile.width, tile.height) for _, tile in tiles], page_size, padding)
+    os.makedirs(output_dir, exist_ok=True)
+    index = {"page_size": page_size, "padding": padding, "pages": [], "tiles": [], "entries": entries}
+    for page, packer in enumerate(packers):
+        atlas = Image.new(mode, (page_size, page_size), 0)
+        for (name, tile), (tile_page, x, y) in zip(tiles, placements):
+            if tile_page == page:
+                atlas.paste(render(tile), (x, y))
+        file_name = f"atlas_{page}.png"
+        atlas.save(os.path.join(output_dir, file_name))
+        index["pages"].append({"file": file_name, "width": page_size, "height": page_size,
+                               "occupancy": round(packer.occupancy(), 4)})
+    for (name, tile), (page, x, y) in zip(tiles, placements):
+        index["tiles"].append({"system": name, "page": page, "rect": [x, y, tile.width, tile.height]})
+    for entry in entries:
+        slot = index["tiles"][entry["tile"]]
+        entry["page"], entry["rect"] = slot["page"], slot["rect"]
+    index_path = os.path.join(output_dir, INDEX_NAME)
+    with open(index_path, "w") as f:
+        json.dump(index, f, indent=2)
+    return index_path, len(packers)
@@ -0,0 +1,266 @@
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import PIL
+import assets
+import system
+import ship_creator
+from layout import iter_boxes, find_boxes, rasterize, sprite_cache_info
+from system import layout_system, tile_size
+from ship_creator import layout_ship_sheet, render_ship_sheet, DPI, MIN_DPI
+
+# One system of each kind drawn by layout_system
+SYSTEM_CASES = {
+    "plain": {"name": "Armor Plates", "rules": "Support System; cannot be repaired", "areas": [],
+              "electronics": False, "hull": True, "life_support": False},
+    "weapon": {"name": "Broadside", "rules": "Weapon, Side Only", "areas": [
+        {"name": "EMP Salvo", "description": "EMP", "shoot": {"damage": 3, "range": "0-3"}, "cost": {"energy": 3, "crew": 0}},
+        {"name": "Explosive Salvo", "description": "", "shoot": {"damage": 4, "range": "0-3"}, "cost": {"energy": 1, "crew": 2}},
+    ], "electronics": False, "hull": True, "life_support": True},
+    "engine": {"name": "Engine", "rules": "Propulsion System", "areas": [
+        {"name": "Cruise", "description": "", "engine": {"speed": "2-3", "steer": "45°"}, "cost": {"energy": 1, "crew": 0}},
+        {"name": "Pivot", "description": "", "engine": {"speed": "0-1", "steer": "90°"}, "cost": {"energy": 1, "crew": 1}},
+    ], "electronics": False, "hull": False, "life_support": False},
+    "mess": {"name": "Mess", "rules": "Crew: 5", "med_bay": 2, "electronics": False, "hull": False, "life_support": True},
+    "reactor": {"name": "Reactor", "rules": "Energy Production: 12", "circles": 12, "electronics": True, "hull": False, "life_support": False},
+}
+
+LONG_RULES = ("Support System; cannot be repaired while the ship is engaged, and loses one crew "
+              "every time it is hit by a weapon with the anti-Capital rule. ") * 3
+
+def stress_ship(index, systems_per_section=8, areas_per_system=4, shields=8):
+    """Return a synthetic ship with many systems, areas and shields and long rules text."""
+    def stress_system(section, number):
+        areas = []
+        for area in range(areas_per_system):
+            entry = {"name": f"Mode {area + 1}", "description": "Spend for extra effect " * (area + 1),
+                     "cost": {"energy": area % 4, "crew": (area + 1) % 3}}
+            if area % 3 == 1:
+                entry["shoot"] = {"damage": area + 2, "range": f"0-{area + 1}"}
+            elif area % 3 == 2:
+                entry["engine"] = {"speed": f"{area}-{area + 2}", "steer": "45°"}
+            areas.append(entry)
+        return {"name": f"{section.title()} System {number}", "rules": LONG_RULES if number % 2 else "Weapon",
+                "areas": areas, "electronics": number % 2 == 0, "hull": True, "life_support": number % 3 == 0}
+
+    return {
+        "title": f"Stress Ship {index}",
+        "subtitle": "Synthetic benchmark ship",
+        "command": 3,
+        "control": 4,
+        "shields": {"front": [2] * shields, "rear": [1] * shields},
+        "reactor": dict(SYSTEM_CASES["reactor"]),
+        "mess": dict(SYSTEM_CASES["mess"]),
+        "sections": {section: [stress_system(section, n) for n in range(systems_per_section)]
+                     for section in ["left", "core", "right"]},
+    }
+
+def peak_rss_mb():
+    """Return the peak resident set size of this process in MB."""
+    try:
+        # On Linux ru_maxrss carries over the peak of the parent across exec, VmHWM does not
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def cache_counts():
+    """Return the current asset registry, text measurement and sprite cache counters."""
+    text = system._measure_text.cache_info()
+    sprites = sprite_cache_info()
+    return {"fonts": assets.stats()["fonts"], "icons": assets.stats()["icons"],
+            "text_hits": text.hits, "text_misses": text.misses,
+            "sprite_hits": sprites["hits"], "sprite_misses": sprites["misses"]}
+
+def count_deltas(before, after):
+    """Return how much each counter grew between two cache_counts() snapshots."""
+    return {name: after[name] - before[name] for name in after}
+
+def case_peak_rss_mb(name, args):
+    """Run a single case in a fresh interpreter and return the peak RSS of that process in MB.
+
+    The peak of a process only ever grows, so it is measured apart from the other cases. Memory of
+    --jobs worker processes is not included.
+    """
+    command = [sys.executable, os.path.abspath(__file__), "--peak-of", name, "--repeat", str(args.repeat),
+               "--dpi", str(args.dpi), "--stress", str(args.stress), "--jobs", str(args.jobs)]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"Warning: Could not measure the peak RSS of {name}: {result.stderr.strip()}")
+        return None
+    return float(result.stdout.split()[-1])
+
+def run_case(name, fn, repeat, peak_rss):
+    """Time fn once cold and then repeat times warm, returning its result entry.
+
+    The stage times and counts are those of the last run, the counts cover every run. peak_rss
+    is the peak RSS of the case measured on its own, see case_peak_rss_mb.
+    """
+    times = []
+    counts_before = cache_counts()
+    for _ in range(repeat + 1):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            details = fn() or {}
+            times.append(time.perf_counter() - start)
+    cold, times = times[0], times[1:]
+    result = {
+        "name": name,
+        "repeat": repeat,
+        "cold_s": cold,
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "peak_rss_mb": round(peak_rss, 1) if peak_rss is not None else None,
+        "counts": count_deltas(counts_before, cache_counts()),
+    }
+    result.update(details)
+    peak = f"{peak_rss:.0f}MB" if peak_rss is not None else "n/a"
+    print(f"{name:<50} cold {cold * 1000:9.1f}ms  min {result['min_s'] * 1000:9.1f}ms  median {result['median_s'] * 1000:9.1f}ms  "
+          f"peak RSS {peak}")
+    return result
+
+def bench_system(system_data, dpi):
+    """Lay out and rasterize one system tile, timing each stage."""
+    tile_width_px, tile_height_px = tile_size(dpi)
+    start = time.perf_counter()
+    tile = layout_system(system_data, tile_width_px, tile_height_px, dpi)
+    layout_end = time.perf_counter()
+    rasterize(tile)
+    return {"stages": {"layout_s": layout_end - start, "raster_s": time.perf_counter() - layout_end},
+            "boxes": sum(1 for _ in iter_boxes(tile))}
+
+def bench_sheet(ship_data, output_path, dpi):
+    """Lay out, rasterize and encode one ship sheet, timing each stage."""
+    start = time.perf_counter()
+    sheet = layout_ship_sheet(ship_data, dpi)
+    layout_end = time.perf_counter()
+    img = render_ship_sheet(sheet)
+    raster_end = time.perf_counter()
+    img.save(output_path)
+    encode_end = time.perf_counter()
+    return {"stages": {"layout_s": layout_end - start, "raster_s": raster_end - layout_end, "encode_s": encode_end - raster_end},
+            "boxes": sum(1 for _ in iter_boxes(sheet)), "tiles": len(find_boxes(sheet, "tile"))}
+
+def bench_batch(work_dir, argv):
+    """Run ship_creator.main() in work_dir with the given arguments."""
+    cwd = os.getcwd()
+    saved_argv = sys.argv
+    os.chdir(work_dir)
+    sys.argv = ["ship_creator.py"] + argv
+    try:
+        ship_creator.main()
+    finally:
+        sys.argv = saved_argv
+        os.chdir(cwd)
+
+def git_commit():
+    """Return the current git commit, or None outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline_path):
+    """Print the median time of every case relative to a previous results file."""
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)
+    previous = {entry["name"]: entry for entry in baseline["results"]}
+    print(f"\nCompared to {baseline.get('commit') or baseline_path}:")
+    for entry in results:
+        old = previous.get(entry["name"])
+        if old is None:
+            continue
+        ratio = entry["median_s"] / old["median_s"] if old["median_s"] else float("inf")
+        print(f"{entry['name']:<50} {old['median_s'] * 1000:9.1f}ms -> {entry['median_s'] * 1000:9.1f}ms  ({ratio:.2f}x the time)")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the system tile and ship sheet renderers.')
+    parser.add_argument('-o', '--output', default='benchmark.json', help='Write the results to this JSON file (default: benchmark.json)')
+    parser.add_argument('-r', '--repeat', type=int, default=3, metavar='N', help='Runs of each case (default: 3)')
+    parser.add_argument('--dpi', type=int, default=DPI, help=f'Resolution to render at (default: {DPI})')
+    parser.add_argument('--stress', type=int, default=3, metavar='N', help='Number of synthetic stress ships (default: 3)')
+    parser.add_argument('--jobs', type=int, default=1, metavar='N', help='Worker processes of the batch case (default: 1)')
+    parser.add_argument('--only', metavar='PREFIX', help='Only run the cases whose name starts with PREFIX (e.g., system/)')
+    parser.add_argument('--compare', metavar='FILE', help='Print the speedup over a previous results file')
+    parser.add_argument('--peak-of', metavar='CASE', help=argparse.SUPPRESS)  # Internal: run one case and print its peak RSS
+    args = parser.parse_args()
+
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+    if args.dpi < MIN_DPI:
+        parser.error(f"--dpi must be at least {MIN_DPI}")
+
+    ship_paths = sorted(p for p in glob.glob(os.path.join("ships", "*.json")) if not os.path.basename(p).startswith("."))
+    work_dir = tempfile.mkdtemp(prefix="benchmark_")
+    try:
+        cases = []
+        for kind, system_data in SYSTEM_CASES.items():
+            cases.append((f"system/{kind}", lambda s=system_data: bench_system(s, args.dpi)))
+        for path in ship_paths:
+            with open(path, "r") as f:
+                ship_data = json.load(f)
+            output_path = os.path.join(work_dir, "sheet.jpg")
+            cases.append((f"sheet/{os.path.basename(path)}", lambda s=ship_data, o=output_path: bench_sheet(s, o, args.dpi)))
+        for index in range(args.stress):
+            stress = stress_ship(index, systems_per_section=4 + 2 * index, areas_per_system=2 + index, shields=4 + 2 * index)
+            output_path = os.path.join(work_dir, "stress.jpg")
+            cases.append((f"stress/{index}", lambda s=stress, o=output_path: bench_sheet(s, o, args.dpi)))
+
+        # Batch runs in a scratch copy of ships/, so no sheets or manifest land in the repository
+        batch_dir = os.path.join(work_dir, "batch")
+        os.makedirs(os.path.join(batch_dir, "ships"))
+        for path in ship_paths:
+            shutil.copy(path, os.path.join(batch_dir, "ships"))
+        for asset_dir in ("fonts", "resources"):
+            os.symlink(os.path.abspath(asset_dir), os.path.join(batch_dir, asset_dir))
+        batch_argv = ["--force", "--jobs", str(args.jobs), "--dpi", str(args.dpi)]
+        cases.append(("batch/main", lambda: bench_batch(batch_dir, batch_argv)))
+        cases.append(("batch/main-incremental", lambda: bench_batch(batch_dir, ["--jobs", str(args.jobs), "--dpi", str(args.dpi)])))
+
+        if args.peak_of:
+            fn = dict(cases)[args.peak_of]
+            for _ in range(args.repeat + 1):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    fn()
+            print(f"{peak_rss_mb():.1f}")
+            return
+
+        results = [run_case(name, fn, args.repeat, case_peak_rss_mb(name, args)) for name, fn in cases
+                   if args.only is None or name.startswith(args.only)]
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "platform": platform.platform(),
+        "dpi": args.dpi,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved benchmark results to: {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import tempfile
+
+MANIFEST_NAME = ".build_manifest.json"
+
+def file_hash(path):
+    """Return the SHA-256 of a file's contents."""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def entry_outputs(entry):
+    """Return every file written for a manifest entry: the sheet and its other sizes."""
+    outputs = [entry["output"]]
+    for size in entry.get("sizes", []):
+        if size["output"] not in outputs:
+            outputs.append(size["output"])
+    return outputs
+
+class BuildManifest:
+    """Record of the inputs each rendered sheet was built from.
+
+    Every entry maps a source JSON file to the hash of its contents, the hash of the
+    font and resource files, the renderer version, the render settings (such as the DPI)
+    and the output it produced, with the DPI, path and pixel size of each saved size of the
+    sheet. A ship whose entry still matches does not need to be rendered again.
+    """
+
+    def __init__(self, path, assets_hash, renderer_version, settings=None):
+        self.path = path
+        self.assets_hash = assets_hash
+        self.renderer_version = renderer_version
+        self.settings = settings or {}
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self.entries = json.load(f).get("entries", {})
+            except (OSError, ValueError) as e:
+                print(f"Warning: Could not read build manifest {path}, rebuilding everything: {str(e)}")
+        # Sources writing each output path, several ships may share a title
+        self.output_sources = {}
+        for source, entry in self.entries.items():
+            self._index(source, entry)
+
+    def _index(self, source, entry):
+        for output_path in entry_outputs(entry):
+            self.output_sources.setdefault(output_path, set()).add(source)
+
+    def _unindex(self, source, entry):
+        for output_path in entry_outputs(entry):
+            sources = self.output_sources.get(output_path)
+            if sources is not None:
+                sources.discard(source)
+                if not sources:
+                    del self.output_sources[output_path]
+
+    def is_up_to_date(self, source, json_hash):
+        """Return the recorded output of source if it was built from the same inputs, else None."""
+        entry = self.entries.get(source)
+        if (entry is None
+                or entry["json_hash"] != json_hash
+                or entry["assets_hash"] != self.assets_hash
+                or entry["renderer_version"] != self.renderer_version
+                or entry.get("settings", {}) != self.settings
+                or not all(os.path.exists(path) for path in entry_outputs(entry))):
+            return None
+        return entry["output"]
+
+    def record(self, source, json_hash, output_path, sizes=None):
+        """Record that source was rendered to output_path from the current inputs.
+
+        sizes lists a {"dpi", "output", "width", "height"} dict for every size the sheet was saved at.
+        Files of the previous build of source that are no longer written (such as a size dropped
+        from the pyramid) are deleted.
+        """
+        previous = self.entries.get(source)
+        if previous is not None:
+            self._unindex(source, previous)
+        self.entries[source] = {
+            "json_hash": json_hash,
+            "assets_hash": self.assets_hash,
+            "renderer_version": self.renderer_version,
+            "settings": self.settings,
+            "output": output_path,
+        }
+        if sizes is not None:
+            self.entries[source]["sizes"] = sizes
+        self._index(source, self.entries[source])
+
+        if previous is not None:
+            for output_path in entry_outputs(previous):
+                # Still written by this build, or another ship may have taken over the same output name
+                if output_path in self.output_sources:
+                    continue
+                try:
+                    os.remove(output_path)
+                except FileNotFoundError:
+                    pass
+
+    def prune(self, sources):
+        """Forget every source not in sources and delete its output, returning the deleted paths."""
+        sources = set(sources)
+        stale = [source for source in self.entries if source not in sources]
+        for source in stale:
+            self._unindex(source, self.entries[source])
+        removed = []
+        for source in stale:
+            for output_path in entry_outputs(self.entries.pop(source)):
+                # Another ship may have taken over the same output name
+                if output_path in self.output_sources:
+                    continue
+                try:
+                    os.remove(output_path)
+                    removed.append(output_path)
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    def save(self):
+        """Write the manifest atomically."""
+        directory = os.path.dirname(self.path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"entries": self.entries}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,121 @@
+import json
+
+READ_CHUNK_SIZE = 64 * 1024  # Characters read at a time from a JSON array bundle
+MAX_RECORD_CHARS = 1024 * 1024  # Ship JSONs are a few KB, a longer record of a JSON array is malformed
+_WHITESPACE = " \t\r\n"
+
+class BundleError(ValueError):
+    """A record of a bundle that could not be parsed."""
+
+def iter_bundle(path):
+    """Yield (line number, ship data) for each ship of a bundle file, reading it incrementally.
+
+    A bundle is either JSON Lines (one ship object per line) or a single top-level JSON array
+    of ship objects. Only one record is held in memory at a time. A record that cannot be
+    parsed is yielded as a BundleError instead of its ship data; a malformed JSON array stops
+    at the first error since the following records cannot be located reliably. A record of a
+    JSON array is never read past MAX_RECORD_CHARS, so a malformed one does not pull the rest
+    of the file into memory.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        # Look at the first non-blank character to tell the two formats apart
+        first = ""
+        while True:
+            char = f.read(1)
+            if not char or char not in _WHITESPACE:
+                first = char
+                break
+        f.seek(0)
+        if first == "[":
+            yield from _iter_json_array(f)
+        else:
+            yield from _iter_json_lines(f)
+
+def _check_record(record):
+    if not isinstance(record, dict):
+        return BundleError(f"expected a ship object, got {type(record).__name__}")
+    return record
+
+def _iter_json_lines(f):
+    for line_number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, BundleError(f"{e.msg} at column {e.colno}")
+            continue
+        yield line_number, _check_record(record)
+
+def _iter_json_array(f):
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    line = 1
+    eof = False
+
+    def read_more():
+        # Drop the consumed part of the buffer and append the next chunk
+        nonlocal buffer, pos, eof
+        chunk = f.read(READ_CHUNK_SIZE)
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        eof = not chunk
+
+    def skip_whitespace():
+        nonlocal pos, line
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                if buffer[pos] == "\n":
+                    line += 1
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            read_more()
+
+    skip_whitespace()
+    pos += 1  # The opening bracket, checked by iter_bundle
+    skip_whitespace()
+    if pos < len(buffer) and buffer[pos] == "]":
+        return
+
+    index = 0
+    while True:
+        skip_whitespace()
+        start_line = line
+        index += 1
+        while True:
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                if eof:
+                    # Positions in the error are relative to the buffer, report the line in the file
+                    error_line = line + buffer.count("\n", pos, e.pos)
+                    yield start_line, BundleError(f"record {index}: {e.msg} at line {error_line}")
+                    return
+                if len(buffer) - pos > MAX_RECORD_CHARS:
+                    yield start_line, BundleError(f"record {index} is malformed or longer than {MAX_RECORD_CHARS} characters")
+                    return
+                read_more()
+                continue
+            if end == len(buffer) and not eof:
+                # A number or literal may continue in the next chunk
+                read_more()
+                continue
+            break
+
+        line += buffer.count("\n", pos, end)
+        pos = end
+        yield start_line, _check_record(record)
+
+        skip_whitespace()
+        if pos >= len(buffer):
+            yield line, BundleError("unterminated JSON array")
+            return
+        separator = buffer[pos]
+        pos += 1
+        if separator == "]":
+            return
+        if separator != ",":
+            yield line, BundleError(f"expected ',' or ']' between records, got {separator!r}")
+            return
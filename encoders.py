@@ -0,0 +1,78 @@
+import queue
+import threading
+
+# Pillow format names of the raster output formats
+FORMATS = {
+    "jpg": "JPEG",
+    "png": "PNG",
+    "webp": "WEBP",
+}
+JPEG_SUBSAMPLING = ["4:4:4", "4:2:2", "4:2:0"]
+
+def encoder_options(output_format, quality=None, progressive=False, optimize=False, subsampling=None,
+                    compress_level=None, lossless=False):
+    """Return the Pillow save options of a raster output format.
+
+    Options left to None keep Pillow's defaults, so the default JPEG output is unchanged.
+    """
+    options = {"format": FORMATS[output_format]}
+    if output_format == "jpg":
+        if quality is not None:
+            options["quality"] = quality
+        if subsampling is not None:
+            options["subsampling"] = subsampling
+        options["progressive"] = progressive
+        options["optimize"] = optimize
+    elif output_format == "png":
+        if compress_level is not None:
+            options["compress_level"] = compress_level
+        options["optimize"] = optimize
+    elif output_format == "webp":
+        if quality is not None:
+            options["quality"] = quality
+        options["lossless"] = lossless
+    return options
+
+def save_image(img, output_path, options=None):
+    """Encode img and write it to output_path with the given encoder options."""
+    img.save(output_path, **(options or {}))
+
+class BackgroundWriter:
+    """Run encoding and file writes on a background thread.
+
+    submit() queues a call and returns a Future for its result. Once max_pending calls are
+    waiting it blocks, so a renderer running ahead never holds more than max_pending finished
+    images in memory. Pillow releases the GIL while encoding, so the next sheet renders meanwhile.
+    """
+
+    def __init__(self, max_pending=2):
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name="BackgroundWriter", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            future, fn, args = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def submit(self, fn, *args):
+        """Queue fn(*args) and return its Future, waiting while the queue is full."""
+        # concurrent.futures (and the logging it loads) is only needed once something is encoded in the background
+        from concurrent.futures import Future
+
+        future = Future()
+        self._queue.put((future, fn, args))
+        return future
+
+    def close(self):
+        """Wait for every queued call to finish and stop the thread."""
+        self._queue.put(None)
+        self._thread.join()
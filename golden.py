@@ -0,0 +1,279 @@
+import argparse
+import contextlib
+import functools
+import glob
+import io
+import itertools
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+from layout import rasterize
+from system import layout_system, tile_size
+from tile_cache import TileCache, MemoryTileCache
+from tile_pool import TilePool
+from encoders import encoder_options
+from ship_creator import layout_ship_sheet, render_ship_sheet, render_ship, ship_tiles, _init_worker, _render_in_worker, MIN_DPI
+
+GOLDEN_DIR = "golden"  # Reference renders, committed for GOLDEN_DPI
+GOLDEN_DPI = 100  # Resolution of the committed golden images, small enough to keep in the repository
+REPORT_NAME = "report.json"
+
+# Color modes every rendering path is checked in
+PATH_MODES = ("RGB", "L")
+
+def slug(name):
+    """Return a file name for a ship or system name."""
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
+
+def golden_cases(ship_paths, dpi):
+    """Yield (case name, render function) for every ship sheet (in color, grayscale and black and white) and every system tile of the ships.
+
+    Systems are rendered as standalone tiles at their nominal 8cm width, once per ship even when
+    several ships share them, so a drifting tile is reported with the ship it came from.
+    """
+    for path in ship_paths:
+        with open(path, "r") as f:
+            ship_data = json.load(f)
+        ship = os.path.splitext(os.path.basename(path))[0]
+        yield f"sheet/{ship}", lambda s=ship_data: render_ship_sheet(layout_ship_sheet(s, dpi))
+        yield f"sheet_gray/{ship}", lambda s=ship_data: render_ship_sheet(layout_ship_sheet(s, dpi), mode="L")
+        yield (f"sheet_bw/{ship}",
+               lambda s=ship_data: render_ship_sheet(layout_ship_sheet(s, dpi), mode="L").convert("1", dither=Image.Dither.NONE))
+        for system_data in ship_tiles(ship_data):
+            yield (f"system/{ship}/{slug(system_data['name'])}",
+                   lambda s=system_data: rasterize(layout_system(s, *tile_size(dpi), dpi)))
+
+def decode(data):
+    """Return the image encoded in data."""
+    with Image.open(io.BytesIO(data)) as img:
+        img.load()
+    return img
+
+def encoded_sheet(result):
+    """Return the sheet decoded from the (log, success, ..., bytes) result of render_ship or _render_in_worker."""
+    log, ok, data = result[0], result[1], result[-1]
+    if not ok:
+        raise RuntimeError(log.strip())
+    with Image.open(io.BytesIO(data[0])) as img:
+        img.load()
+    return img
+
+def path_cases(ship_paths, dpi, workers=2):
+    """Yield (case name, expected render function, render function) for every optimized rendering path of every ship sheet.
+
+    Each render must be identical to the expected serial render_ship_sheet of the sheet, in every
+    mode of PATH_MODES: through a
+    cold and a warm on-disk tile cache, an in-memory tile cache, a TilePool (--tile-jobs), a batch
+    worker process (--jobs) and the lossless PNG and WebP encoders. The caches and worker
+    processes are shared by every ship, like in a batch run.
+    """
+    png = encoder_options("png")
+    webp = encoder_options("webp", lossless=True)
+    with tempfile.TemporaryDirectory() as cache_dir, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(None, 0, dpi)) as executor:
+        tile_cache = TileCache(cache_dir)
+        memory_tiles = MemoryTileCache(64)
+        tile_pool = TilePool(workers, dpi)
+        try:
+            for path in ship_paths:
+                with open(path, "r") as f:
+                    ship_data = json.load(f)
+                ship = os.path.splitext(os.path.basename(path))[0]
+                for mode in PATH_MODES:
+                    def sheet(cache=None, pool=None, s=ship_data, m=mode):
+                        return render_ship_sheet(layout_ship_sheet(s, dpi), cache, m, pool)
+
+                    # Rendered once, for all the paths of the ship in this mode
+                    serial = functools.lru_cache(maxsize=None)(sheet)
+
+                    def job(s=ship_data, m=mode, source=ship):
+                        return encoded_sheet(executor.submit(_render_in_worker, source, s, "sheet.png", dpi, png, True, (), m).result())
+
+                    def encode(encoder, s=ship_data, m=mode, source=ship):
+                        return encoded_sheet(render_ship(source, s, "sheet.png", dpi=dpi, encoder=encoder, to_bytes=True, color_mode=m))
+
+                    yield f"path/tile_cache/{mode}/{ship}", serial, lambda sheet=sheet: sheet(tile_cache)
+                    yield f"path/tile_cache_warm/{mode}/{ship}", serial, lambda sheet=sheet: sheet(tile_cache)
+                    yield f"path/memory_tiles/{mode}/{ship}", serial, lambda sheet=sheet: sheet(memory_tiles)
+                    yield f"path/tile_pool/{mode}/{ship}", serial, lambda sheet=sheet: sheet(pool=tile_pool)
+                    yield f"path/jobs/{mode}/{ship}", serial, job
+                    yield f"path/png/{mode}/{ship}", serial, lambda encode=encode: encode(png)
+                    yield f"path/webp_lossless/{mode}/{ship}", serial, lambda encode=encode: encode(webp)
+        finally:
+            tile_pool.close()
+
+def check_path(name, img, expected, diff_dir, region):
+    """Compare the render of an optimized path with the serial render, writing a heatmap on failure. Returns the case result."""
+    expected = load_pixels(expected)
+    actual = load_pixels(img)
+    if expected.shape != actual.shape:
+        return {"name": name, "status": "fail", "expected_size": [expected.shape[1], expected.shape[0]],
+                "actual_size": [actual.shape[1], actual.shape[0]]}
+    stats, difference = diff_images(expected, actual, 0, region)
+    result = {"name": name, "status": "fail" if stats["differing_pixels"] else "pass"}
+    result.update(stats)
+    if stats["differing_pixels"]:
+        heatmap_path = os.path.join(diff_dir, name + ".png")
+        write_heatmap(expected, difference, heatmap_path)
+        result["heatmap"] = heatmap_path
+    return result
+
+def load_pixels(img):
+    """Return an image as an int16 RGB array, so differences do not wrap around."""
+    return np.asarray(img.convert("RGB"), dtype=np.int16)
+
+def diff_images(expected, actual, tolerance=0, region=32):
+    """Compare two RGB arrays of the same shape, returning the diff statistics and the per-pixel difference.
+
+    A pixel differs when one of its channels is off by more than tolerance. The image is also split
+    into region x region blocks so a few noisy pixels spread out can be told apart from a block
+    that moved.
+    """
+    difference = np.abs(expected - actual).max(axis=2)
+    differing = difference > tolerance
+    height, width = difference.shape
+    # Pad to whole regions, then take the worst pixel of each block
+    padded = np.zeros((-(-height // region) * region, -(-width // region) * region), dtype=difference.dtype)
+    padded[:height, :width] = difference
+    blocks = padded.reshape(padded.shape[0] // region, region, padded.shape[1] // region, region).max(axis=(1, 3))
+    stats = {
+        "max_diff": int(difference.max()),
+        "mean_diff": round(float(difference.mean()), 4),
+        "differing_pixels": int(differing.sum()),
+        "differing_fraction": round(float(differing.mean()), 6),
+        "differing_regions": int((blocks > tolerance).sum()),
+        "regions": int(blocks.size),
+    }
+    if stats["differing_pixels"]:
+        rows = np.flatnonzero(differing.any(axis=1))
+        columns = np.flatnonzero(differing.any(axis=0))
+        stats["bbox"] = [int(columns[0]), int(rows[0]), int(columns[-1]) + 1, int(rows[-1]) + 1]
+    return stats, difference
+
+def write_heatmap(expected, difference, path):
+    """Save a heatmap of difference in red over a faded grayscale copy of the expected image."""
+    gray = expected.mean(axis=2) * 0.3 + 140
+    heat = np.clip(difference.astype(np.float32) * (255 / max(int(difference.max()), 1)), 0, 255)
+    heatmap = np.stack([np.maximum(gray, heat), gray * (1 - heat / 255), gray * (1 - heat / 255)], axis=2)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.fromarray(heatmap.astype(np.uint8)).save(path)
+
+def check_case(name, img, golden_path, diff_dir, tolerance, max_fraction, region):
+    """Compare a render with its golden image, writing a heatmap on failure. Returns the case result."""
+    if not os.path.exists(golden_path):
+        return {"name": name, "status": "missing"}
+    expected = load_pixels(Image.open(golden_path))
+    actual = load_pixels(img)
+    if expected.shape != actual.shape:
+        return {"name": name, "status": "fail", "expected_size": [expected.shape[1], expected.shape[0]],
+                "actual_size": [actual.shape[1], actual.shape[0]]}
+    stats, difference = diff_images(expected, actual, tolerance, region)
+    status = "pass" if stats["differing_fraction"] <= max_fraction else "fail"
+    result = {"name": name, "status": status}
+    result.update(stats)
+    if status == "fail":
+        heatmap_path = os.path.join(diff_dir, name + ".png")
+        write_heatmap(expected, difference, heatmap_path)
+        result["heatmap"] = heatmap_path
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the rendered ship sheets and system tiles with stored golden images.')
+    parser.add_argument('--golden-dir', default=GOLDEN_DIR, metavar='DIR', help=f'Directory of the golden images (default: {GOLDEN_DIR})')
+    parser.add_argument('--update', action='store_true', help='Store the current renders as the new golden images instead of comparing')
+    parser.add_argument('--dpi', type=int, default=GOLDEN_DPI, help=f'Resolution to render at (default: {GOLDEN_DPI}, the committed golden images), each DPI has its own golden images')
+    parser.add_argument('--tolerance', type=int, default=0, metavar='N', help='Largest channel difference (0-255) of a pixel that still matches (default: 0)')
+    parser.add_argument('--max-fraction', type=float, default=0.0, metavar='F', help='Fraction of differing pixels a render may have and still pass (default: 0)')
+    parser.add_argument('--region', type=int, default=32, metavar='PX', help='Size of the square regions counted in the region diff (default: 32)')
+    parser.add_argument('--only', metavar='PREFIX', help='Only check the cases whose name starts with PREFIX (e.g., sheet/, system/starliner/ or path/tile_pool/)')
+    parser.add_argument('--skip-paths', action='store_true', help='Do not check that the cached, parallel, pooled and encoded renders match the serial ones')
+    parser.add_argument('--workers', type=int, default=2, metavar='N', help='Worker processes of the --jobs and --tile-jobs path checks (default: 2)')
+    args = parser.parse_args()
+
+    if args.dpi < MIN_DPI:
+        parser.error(f"--dpi must be at least {MIN_DPI}")
+    if not 0 <= args.tolerance <= 255:
+        parser.error("--tolerance must be between 0 and 255")
+    if args.region < 1:
+        parser.error("--region must be at least 1")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    ship_paths = sorted(p for p in glob.glob(os.path.join("ships", "*.json")) if not os.path.basename(p).startswith("."))
+    golden_dir = os.path.join(args.golden_dir, f"{args.dpi}dpi")
+    diff_dir = os.path.join(golden_dir, "diffs")
+    # Heatmaps of an earlier run would be mistaken for current failures
+    shutil.rmtree(diff_dir, ignore_errors=True)
+    results = []
+    start = time.perf_counter()
+    cases = ((name, None, render) for name, render in golden_cases(ship_paths, args.dpi))
+    # The optimized paths are compared with the serial render, they have no golden images to update
+    if not args.update and not args.skip_paths and (args.only is None or args.only.startswith("path/") or "path/".startswith(args.only)):
+        cases = itertools.chain(cases, path_cases(ship_paths, args.dpi, args.workers))
+    for name, expected, render in cases:
+        if args.only is not None and not name.startswith(args.only):
+            continue
+        render_start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            img = render()
+        render_s = time.perf_counter() - render_start
+        golden_path = os.path.join(golden_dir, name + ".png")
+
+        if expected is not None:
+            compare_start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                expected_img = expected()
+            result = check_path(name, img, expected_img, diff_dir, args.region)
+            result["compare_s"] = round(time.perf_counter() - compare_start, 4)
+        elif args.update:
+            os.makedirs(os.path.dirname(golden_path), exist_ok=True)
+            img.save(golden_path)
+            result = {"name": name, "status": "updated"}
+        else:
+            compare_start = time.perf_counter()
+            result = check_case(name, img, golden_path, diff_dir, args.tolerance, args.max_fraction, args.region)
+            result["compare_s"] = round(time.perf_counter() - compare_start, 4)
+        result["render_s"] = round(render_s, 4)
+        results.append(result)
+
+        details = ""
+        if "max_diff" in result and result["differing_pixels"]:
+            details = (f"  {result['differing_pixels']} pixels in {result['differing_regions']} regions differ, "
+                       f"max {result['max_diff']}, bbox {result['bbox']}")
+        elif "expected_size" in result:
+            details = f"  size {result['actual_size']}, expected {result['expected_size']}"
+        print(f"{result['status'].upper():<8} {name:<60} {render_s * 1000:8.1f}ms{details}")
+
+    counts = {status: sum(1 for r in results if r["status"] == status) for status in ("pass", "fail", "missing", "updated")}
+    report = {
+        "dpi": args.dpi,
+        "tolerance": args.tolerance,
+        "max_fraction": args.max_fraction,
+        "elapsed_s": round(time.perf_counter() - start, 3),
+        "counts": counts,
+        "results": results,
+    }
+    os.makedirs(golden_dir, exist_ok=True)
+    report_path = os.path.join(golden_dir, REPORT_NAME)
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    if args.update:
+        print(f"Updated {counts['updated']} golden images in {golden_dir}")
+        return
+    print(f"{counts['pass']} passed, {counts['fail']} failed, {counts['missing']} missing golden images "
+          f"in {report['elapsed_s']:.1f}s (report: {report_path})")
+    if counts["missing"]:
+        print("Run with --update to store the missing golden images")
+    if counts["fail"] or counts["missing"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
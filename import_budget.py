@@ -0,0 +1,100 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# Import time allowed for ship_creator on top of Pillow, in milliseconds
+DEFAULT_BUDGET_MS = 40
+
+# Pillow modules the renderer needs anyway. They are imported first in the same interpreter, as a
+# baseline, so the budget only covers the renderer's own imports and not how fast the machine loads Pillow
+BASELINE_MODULES = ["PIL.Image", "PIL.ImageDraw", "PIL.ImageFont"]
+
+# Heavy modules that only optional backends and parallel runs may load, never plain startup
+DEFERRED_MODULES = [
+    "reportlab",           # --format pdf (pdf_backend)
+    "svglib",
+    "lxml",
+    "numpy",               # golden.py only
+    "multiprocessing",     # --jobs N
+    "concurrent.futures.process",
+    "zipfile",             # --archive
+    "tarfile",
+    "http.server",         # render_server.py
+]
+
+def measure_imports(module, baseline=()):
+    """Import the baseline modules, then module, in a fresh interpreter under -X importtime.
+
+    Returns the cumulative import time of module in microseconds (without the baseline modules,
+    already loaded by then), that of the baseline modules and the (self us, cumulative us, name)
+    of every module loaded.
+    """
+    env = dict(os.environ)
+    # Cached bytecode is what users normally run, so let the interpreter write it
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    statements = "".join(f"import {name}; " for name in baseline)
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"{statements}import {module}"],
+                            capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+    imports = []
+    total = None
+    baseline_total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        imports.append((int(self_us), int(cumulative_us), name.strip()))
+        if name.strip() == module:
+            total = int(cumulative_us)
+        elif name.strip() in baseline and len(name) - len(name.lstrip()) == 1:
+            # Only count the top level imports, not a baseline module loaded by another one
+            baseline_total += int(cumulative_us)
+    return total, baseline_total, imports
+
+def deferred_module(name):
+    """Return the entry of DEFERRED_MODULES that a module is or belongs to, or None."""
+    for deferred in DEFERRED_MODULES:
+        if name == deferred or name.startswith(deferred + "."):
+            return deferred
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that importing the renderer stays within its startup time budget.')
+    parser.add_argument('-m', '--module', default='ship_creator', help='Module to import (default: ship_creator)')
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_MS, metavar='MS', help=f'Allowed import time in ms on top of Pillow (default: {DEFAULT_BUDGET_MS})')
+    parser.add_argument('-r', '--repeat', type=int, default=5, metavar='N', help='Number of measured imports, the median is checked (default: 5)')
+    parser.add_argument('--top', type=int, default=10, metavar='N', help='Print the N modules with the largest own import time (default: 10)')
+    args = parser.parse_args()
+
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+
+    # A first import writes the bytecode cache, so it is not measured
+    measure_imports(args.module, BASELINE_MODULES)
+    runs = [measure_imports(args.module, BASELINE_MODULES) for _ in range(args.repeat)]
+    median_ms = statistics.median(total for total, _, _ in runs) / 1000
+    baseline_ms = statistics.median(baseline for _, baseline, _ in runs) / 1000
+    _, _, imports = min(runs, key=lambda run: run[0])
+
+    print(f"Slowest imports of {args.module} (own time):")
+    for self_us, cumulative_us, name in sorted(imports, reverse=True)[:args.top]:
+        print(f"  {name:<40} {self_us / 1000:7.1f}ms  ({cumulative_us / 1000:.1f}ms with its imports)")
+
+    failed = False
+    deferred = sorted({deferred_module(name) for _, _, name in imports} - {None})
+    if deferred:
+        print(f"FAIL: {args.module} loads modules that should only be imported when needed: {', '.join(deferred)}")
+        failed = True
+    if median_ms > args.budget:
+        print(f"FAIL: importing {args.module} takes {median_ms:.1f}ms on top of Pillow ({baseline_ms:.1f}ms), over the {args.budget:.0f}ms budget")
+        failed = True
+    else:
+        print(f"Importing {args.module} takes {median_ms:.1f}ms on top of Pillow ({baseline_ms:.1f}ms) (budget {args.budget:.0f}ms)")
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
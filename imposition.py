@@ -0,0 +1,217 @@
+import io
+import os
+from PIL import Image, ImageDraw, TiffImagePlugin
+
+# Physical page sizes (portrait width, height) in cm
+PAGE_SIZES_CM = {
+    "A4": (21.0, 29.7),
+    "A3": (29.7, 42.0),
+    "Letter": (21.59, 27.94),
+}
+PAGE_MARGIN_MM = 10  # Blank border around the imposed items
+CROP_MARK_GAP_MM = 1  # Space between an item corner and its crop marks
+CROP_MARK_LENGTH_MM = 4
+
+def mm_to_px(mm, dpi):
+    """Convert millimeters to pixels at dpi."""
+    return int(round(mm * dpi / 25.4))
+
+def page_size_px(page, dpi, landscape=False):
+    """Return the pixel size of a named page at dpi."""
+    width_cm, height_cm = PAGE_SIZES_CM[page]
+    if landscape:
+        width_cm, height_cm = height_cm, width_cm
+    return int(round(width_cm * dpi / 2.54)), int(round(height_cm * dpi / 2.54))
+
+def fit_grid(page, dpi, item_size, per_page, gutter_mm):
+    """Find the page orientation and grid fitting per_page items of item_size pixels each.
+
+    Returns (landscape, scale), where scale (at most 1) shrinks the items so the grid fits
+    inside the page margins with gutters between the items.
+    """
+    margin = mm_to_px(PAGE_MARGIN_MM, dpi)
+    gutter = mm_to_px(gutter_mm, dpi)
+    best = None
+    for landscape in (False, True):
+        page_w, page_h = page_size_px(page, dpi, landscape)
+        for cols in range(1, per_page + 1):
+            rows = -(-per_page // cols)  # Ceiling division
+            scale = min((page_w - 2 * margin - (cols - 1) * gutter) / (cols * item_size[0]),
+                        (page_h - 2 * margin - (rows - 1) * gutter) / (rows * item_size[1]),
+                        1.0)
+            if best is None or scale > best[1]:
+                best = (landscape, scale)
+    return best
+
+class StreamingPdfWriter:
+    """Minimal PDF writer that appends one JPEG-compressed raster page at a time.
+
+    Each page is written to disk as soon as it is added, so only the page being
+    built is ever held in memory. The page tree is written when the file is closed.
+    """
+
+    def __init__(self, path, dpi, quality=90):
+        self.dpi = dpi
+        self.quality = quality
+        self._file = open(path, "wb")
+        self._offsets = {}
+        self._page_ids = []
+        self._next_id = 3  # 1 is the catalog and 2 the page tree, both written on close
+        self._file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _write_object(self, obj_id, body, stream=None):
+        self._offsets[obj_id] = self._file.tell()
+        self._file.write(f"{obj_id} 0 obj\n".encode("ascii"))
+        self._file.write(body.encode("ascii"))
+        if stream is not None:
+            self._file.write(b"\nstream\n")
+            self._file.write(stream)
+            self._file.write(b"\nendstream")
+        self._file.write(b"\nendobj\n")
+
+    def _allocate(self):
+        obj_id = self._next_id
+        self._next_id += 1
+        return obj_id
+
+    def add_page(self, page):
+        """Append a page image."""
+        if page.mode not in ("RGB", "L"):
+            page = page.convert("RGB")
+        buffer = io.BytesIO()
+        page.save(buffer, format="JPEG", quality=self.quality)
+        data = buffer.getvalue()
+        color_space = "/DeviceGray" if page.mode == "L" else "/DeviceRGB"
+
+        width_pt = page.width * 72 / self.dpi
+        height_pt = page.height * 72 / self.dpi
+        image_id, content_id, page_id = self._allocate(), self._allocate(), self._allocate()
+
+        self._write_object(image_id,
+                           f"<< /Type /XObject /Subtype /Image /Width {page.width} /Height {page.height} "
+                           f"/ColorSpace {color_space} /BitsPerComponent 8 /Filter /DCTDecode /Length {len(data)} >>",
+                           data)
+        content = f"q {width_pt:.2f} 0 0 {height_pt:.2f} 0 0 cm /Im0 Do Q".encode("ascii")
+        self._write_object(content_id, f"<< /Length {len(content)} >>", content)
+        self._write_object(page_id,
+                           f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width_pt:.2f} {height_pt:.2f}] "
+                           f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>")
+        self._page_ids.append(page_id)
+
+    def close(self):
+        """Write the page tree, the cross-reference table and close the file."""
+        kids = " ".join(f"{page_id} 0 R" for page_id in self._page_ids)
+        self._write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_ids)} >>")
+        self._write_object(1, "<< /Type /Catalog /Pages 2 0 R >>")
+
+        xref_offset = self._file.tell()
+        self._file.write(f"xref\n0 {self._next_id}\n".encode("ascii"))
+        self._file.write(b"0000000000 65535 f \n")
+        for obj_id in range(1, self._next_id):
+            self._file.write(f"{self._offsets[obj_id]:010d} 00000 n \n".encode("ascii"))
+        self._file.write(f"trailer\n<< /Size {self._next_id} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode("ascii"))
+        self._file.close()
+
+class TiffWriter:
+    """Multi-page TIFF writer that appends each page to the file as soon as it is added."""
+
+    def __init__(self, path, dpi):
+        self.dpi = dpi
+        self._writer = TiffImagePlugin.AppendingTiffWriter(path, new=True)
+
+    def add_page(self, page):
+        """Append a page image."""
+        page.save(self._writer, format="TIFF", compression="tiff_deflate", dpi=(self.dpi, self.dpi))
+        self._writer.newFrame()
+
+    def close(self):
+        """Close the file."""
+        self._writer.close()
+
+def open_page_writer(path, dpi):
+    """Return a streaming page writer for a .pdf or .tif/.tiff path."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".pdf":
+        return StreamingPdfWriter(path, dpi)
+    if extension in (".tif", ".tiff"):
+        return TiffWriter(path, dpi)
+    raise ValueError(f"Unsupported imposition output {path}, expected a .pdf or .tif file")
+
+class Imposer:
+    """Lay out images (sheets or tiles) on physical pages and stream each page once it is full.
+
+    Items are placed left to right in rows (shelf packing) with a gutter between them and
+    crop marks at their corners. Only the page being filled is held in memory. Pages are
+    drawn in mode, "RGB" or "L" for grayscale prints.
+    """
+
+    def __init__(self, writer, page, dpi, landscape=False, gutter_mm=10, crop_marks=True, mode="RGB"):
+        self.writer = writer
+        self.mode = mode
+        self.dpi = dpi
+        self.page_size = page_size_px(page, dpi, landscape)
+        self.margin = mm_to_px(PAGE_MARGIN_MM, dpi)
+        self.gutter = mm_to_px(gutter_mm, dpi)
+        self.crop_marks = crop_marks
+        self.pages = 0
+        self._page = None
+
+    def _new_page(self):
+        self._page = Image.new(self.mode, self.page_size, "white")
+        self._draw = ImageDraw.Draw(self._page)
+        self._x = self.margin
+        self._y = self.margin
+        self._row_height = 0
+
+    def add(self, img):
+        """Place an image on the current page, starting a new page when it does not fit."""
+        max_width = self.page_size[0] - 2 * self.margin
+        max_height = self.page_size[1] - 2 * self.margin
+        if img.width > max_width or img.height > max_height:
+            raise ValueError(f"Item of {img.width}x{img.height}px does not fit on a {self.page_size[0]}x{self.page_size[1]}px page")
+
+        if self._page is None:
+            self._new_page()
+
+        # Next row, then next page
+        if self._x + img.width > self.page_size[0] - self.margin:
+            self._x = self.margin
+            self._y += self._row_height + self.gutter
+            self._row_height = 0
+        if self._y + img.height > self.page_size[1] - self.margin:
+            self.flush()
+            self._new_page()
+
+        self._page.paste(img, (self._x, self._y))
+        if self.crop_marks:
+            self._draw_crop_marks(self._x, self._y, img.width, img.height)
+
+        self._x += img.width + self.gutter
+        self._row_height = max(self._row_height, img.height)
+
+    def _draw_crop_marks(self, x, y, width, height):
+        gap = mm_to_px(CROP_MARK_GAP_MM, self.dpi)
+        # Marks stay inside the gutter (or margin) so they never cover a neighbouring item
+        length = min(mm_to_px(CROP_MARK_LENGTH_MM, self.dpi), min(self.gutter // 2, self.margin) - gap)
+        if length <= 0:
+            return
+        line_width = max(1, self.dpi // 150)
+        for corner_x, dx in ((x, -1), (x + width - 1, 1)):
+            for corner_y, dy in ((y, -1), (y + height - 1, 1)):
+                # Horizontal mark level with the edge, vertical mark level with the other edge
+                self._draw.line([(corner_x + dx * gap, corner_y), (corner_x + dx * (gap + length), corner_y)],
+                                fill="black", width=line_width)
+                self._draw.line([(corner_x, corner_y + dy * gap), (corner_x, corner_y + dy * (gap + length))],
+                                fill="black", width=line_width)
+
+    def flush(self):
+        """Write the current page, if it has any item."""
+        if self._page is not None:
+            self.writer.add_page(self._page)
+            self.pages += 1
+            self._page = None
+
+    def close(self):
+        """Write the last page and close the writer."""
+        self.flush()
+        self.writer.close()
@@ -0,0 +1,190 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from PIL import Image, ImageDraw
+from assets import get_icon
+from tracing import span
+
+# Rotations (in degrees) that swap the width and height of a sprite
+QUARTER_TURNS = (90, -90, 270, -270)
+
+# Output color modes: full color, grayscale, and bilevel (drawn in grayscale, thresholded to
+# pure black and white when saved)
+COLOR_MODES = ("RGB", "L", "1")
+
+# Fully transparent white of each sprite layer mode
+_TRANSPARENT = {"RGBA": (255, 255, 255, 0), "LA": (255, 0)}
+
+# Maximum number of composed sprites kept in memory
+SPRITE_CACHE_SIZE = 512
+
+# LRU of composed sprite layers, by sprite kind, key and size
+_sprites = OrderedDict()
+_sprites_lock = threading.Lock()
+_sprite_hits = 0
+_sprite_misses = 0
+
+@dataclass
+class Box:
+    """A positioned box of a tile or sheet layout.
+
+    x and y are relative to the parent box. Group boxes (tile, title, area, ...) only hold
+    children; leaf boxes describe a single drawing operation:
+
+    - "text": text drawn with font at (x, y)
+    - "image": the icon (path, (width, height)) pasted with its alpha at (x, y)
+    - "line" and "polygon": points relative to the parent box, drawn with line_width
+    - "rect": a rectangle outline of line_width around the box
+
+    A sprite box is composed on its own transparent layer (optionally rotated) before being
+    pasted with its alpha, exactly like the badges and icons were built in the original renderer.
+    Sprites with a key (a tuple of everything their content depends on, such as the values and
+    the scale) are composed once and reused from an LRU cache.
+    """
+    kind: str
+    x: float = 0
+    y: float = 0
+    width: int = 0
+    height: int = 0
+    children: list = field(default_factory=list)
+    text: str = None
+    font: object = None
+    icon: tuple = None
+    points: list = None
+    line_width: int = 0
+    fill: str = "black"
+    sprite: bool = False
+    rotate: int = 0
+    name: str = None
+    data: object = None
+    key: tuple = None
+
+    def add(self, child):
+        """Append a child box and return it."""
+        self.children.append(child)
+        return child
+
+def text_box(x, y, text, font, size):
+    """Return a text leaf box drawn at (x, y) whose measured size is size."""
+    return Box("text", x, y, size[0], size[1], text=text, font=font)
+
+def image_box(x, y, path, size):
+    """Return an image leaf box pasting the icon at path resized to size."""
+    return Box("image", x, y, size[0], size[1], icon=(path, tuple(size)))
+
+def iter_boxes(box, x=0, y=0):
+    """Yield (box, absolute x, absolute y) for box and all its descendants, in drawing order."""
+    x += box.x
+    y += box.y
+    yield box, x, y
+    for child in box.children:
+        yield from iter_boxes(child, x, y)
+
+def find_boxes(box, kind):
+    """Return the (box, absolute x, absolute y) of every descendant of the given kind."""
+    return [entry for entry in iter_boxes(box) if entry[0].kind == kind]
+
+def canvas_mode(color_mode):
+    """Return the mode of the canvases drawn for a color mode: "RGB", or "L" for grayscale and bilevel output."""
+    return "RGB" if color_mode == "RGB" else "L"
+
+def layer_mode(mode):
+    """Return the mode of the transparent layers (sprites and icons) pasted onto a canvas of the given mode."""
+    return "LA" if mode in ("L", "LA") else "RGBA"
+
+def icon_mode(mode):
+    """Return the mode icons are converted to for a canvas of the given mode, or None to keep them as loaded."""
+    return "LA" if mode in ("L", "LA") else None
+
+def rasterize(box, mode="RGB", background="white", render_tile=None):
+    """Draw the children of a layout tree onto a new canvas of exactly its size.
+
+    Nested "tile" boxes are rendered on their own canvas by render_tile (rasterize by default)
+    and pasted opaque, so their content never spills outside the tile.
+    """
+    with span("rasterize", kind=box.kind, name=box.name):
+        img = Image.new(mode, (int(box.width), int(box.height)), background)
+        draw = ImageDraw.Draw(img)
+        for child in box.children:
+            draw_box(img, draw, child, 0, 0, render_tile)
+    return img
+
+def compose_sprite(box, mode="RGBA"):
+    """Draw the children of a sprite box onto a transparent layer (RGBA, or LA for grayscale) and apply its rotation.
+
+    The returned layer is shared when the box has a key, and must be treated as read-only.
+    """
+    global _sprite_hits, _sprite_misses
+    if box.key is None:
+        return _compose_layer(box, mode)
+    
+    cache_key = (box.kind, box.key, int(box.width), int(box.height), box.rotate, mode)
+    with _sprites_lock:
+        layer = _sprites.get(cache_key)
+        if layer is not None:
+            _sprites.move_to_end(cache_key)
+            _sprite_hits += 1
+            return layer
+        _sprite_misses += 1
+    
+    layer = _compose_layer(box, mode)
+    with _sprites_lock:
+        _sprites[cache_key] = layer
+        if len(_sprites) > SPRITE_CACHE_SIZE:
+            _sprites.popitem(last=False)
+    return layer
+
+def sprite_cache_info():
+    """Return the hits, misses and current size of the sprite cache."""
+    with _sprites_lock:
+        return {"hits": _sprite_hits, "misses": _sprite_misses, "size": len(_sprites)}
+
+def clear_sprite_cache():
+    """Drop every composed sprite."""
+    with _sprites_lock:
+        _sprites.clear()
+
+def _compose_layer(box, mode):
+    if box.rotate in QUARTER_TURNS:
+        size = (int(box.height), int(box.width))
+    else:
+        size = (int(box.width), int(box.height))
+    layer = Image.new(mode, size, _TRANSPARENT[mode])
+    layer_draw = ImageDraw.Draw(layer)
+    for child in box.children:
+        draw_box(layer, layer_draw, child, 0, 0)
+    if box.rotate:
+        layer = layer.rotate(box.rotate, expand=True)
+    return layer
+
+def draw_box(img, draw, box, x=0, y=0, render_tile=None):
+    """Draw box, positioned relative to (x, y), and its children onto img."""
+    x += box.x
+    y += box.y
+
+    if box.kind == "tile":
+        tile_img = render_tile(box) if render_tile else rasterize(box, img.mode)
+        img.paste(tile_img, (int(x), int(y)))
+        return
+
+    if box.sprite:
+        with span(f"sprite:{box.kind}", name=box.name):
+            layer = compose_sprite(box, layer_mode(img.mode))
+            img.paste(layer, (int(x), int(y)), layer)
+        return
+
+    if box.kind == "text":
+        draw.text((x, y), box.text, font=box.font, fill=box.fill)
+    elif box.kind == "image":
+        icon = get_icon(*box.icon, mode=icon_mode(img.mode))
+        with span("paste_icon", icon=box.icon[0]):
+            img.paste(icon, (int(x), int(y)), icon)
+    elif box.kind == "line":
+        draw.line([(px + x, py + y) for px, py in box.points], fill=box.fill, width=box.line_width)
+    elif box.kind == "polygon":
+        draw.polygon([(px + x, py + y) for px, py in box.points], fill=box.fill)
+    elif box.kind == "rect":
+        draw.rectangle([(x, y), (x + box.width, y + box.height)], outline=box.fill, width=box.line_width)
+
+    for child in box.children:
+        draw_box(img, draw, child, x, y, render_tile)
@@ -0,0 +1,144 @@
+import os
+from reportlab.pdfgen import canvas
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from assets import get_icon
+
+# Names of the TrueType fonts already registered with reportlab, by font path
+_registered_fonts = {}
+
+def register_font(path):
+    """Register a TrueType font with reportlab (embedded as a subset) and return its name."""
+    name = _registered_fonts.get(path)
+    if name is None:
+        name = os.path.splitext(os.path.basename(path))[0]
+        try:
+            pdfmetrics.registerFont(TTFont(name, path))
+        except Exception as e:
+            print(f"Warning: Could not embed {path} in the PDF, falling back to Helvetica: {str(e)}")
+            name = "Helvetica"
+        _registered_fonts[path] = name
+    return name
+
+class PdfRenderer:
+    """Draw layout trees as vector text and shapes on a reportlab canvas.
+
+    Layout coordinates are pixels at dpi with y pointing down, like the raster renderer.
+    The canvas is transformed once so that every box is drawn in those same coordinates.
+    Icons are embedded at the pixel size they have in the layout; reportlab stores each
+    distinct icon once and reuses it as an image XObject.
+    """
+
+    def __init__(self, output_path, page_width_px, page_height_px, dpi):
+        self.dpi = dpi
+        self.px_to_pt = 72 / dpi
+        self.page_size = (page_width_px * self.px_to_pt, page_height_px * self.px_to_pt)
+        self.canvas = canvas.Canvas(output_path, pagesize=self.page_size)
+        self._images = {}
+        self._begin_page()
+
+    def _begin_page(self):
+        # Pixel coordinates with the origin at the top left of the page
+        self.canvas.translate(0, self.page_size[1])
+        self.canvas.scale(self.px_to_pt, -self.px_to_pt)
+
+    def _image(self, icon):
+        reader = self._images.get(icon)
+        if reader is None:
+            reader = ImageReader(get_icon(*icon))
+            self._images[icon] = reader
+        return reader
+
+    def draw(self, box, x=0, y=0):
+        """Draw box, positioned relative to (x, y), and its children."""
+        c = self.canvas
+        x += box.x
+        y += box.y
+
+        if box.kind == "tile":
+            # Tiles are opaque and their content is cropped to the tile, like in the raster sheet
+            c.saveState()
+            path = c.beginPath()
+            path.rect(x, y, box.width, box.height)
+            c.clipPath(path, stroke=0, fill=0)
+            c.setFillColor("white")
+            c.rect(x, y, box.width, box.height, stroke=0, fill=1)
+            for child in box.children:
+                self.draw(child, x, y)
+            c.restoreState()
+            return
+
+        if box.rotate:
+            # Children of rotated sprites are laid out before rotation
+            c.saveState()
+            if box.rotate in (-90, 270):
+                c.translate(x + box.width, y)
+                c.rotate(90)
+            elif box.rotate in (90, -270):
+                c.translate(x, y + box.height)
+                c.rotate(-90)
+            else:
+                c.translate(x, y)
+                c.rotate(-box.rotate)
+            for child in box.children:
+                self.draw(child, 0, 0)
+            c.restoreState()
+            return
+
+        if box.kind == "text":
+            ascent, _ = box.font.getmetrics()
+            c.saveState()
+            c.translate(x, y + ascent)
+            c.scale(1, -1)
+            c.setFillColor(box.fill)
+            c.setFont(register_font(box.font.path), box.font.size)
+            c.drawString(0, 0, box.text)
+            c.restoreState()
+        elif box.kind == "image":
+            width, height = box.icon[1]
+            c.saveState()
+            c.translate(x, y + height)
+            c.scale(1, -1)
+            c.drawImage(self._image(box.icon), 0, 0, width, height, mask="auto")
+            c.restoreState()
+        elif box.kind in ("line", "polygon"):
+            points = [(px + x, py + y) for px, py in box.points]
+            path = c.beginPath()
+            path.moveTo(*points[0])
+            for point in points[1:]:
+                path.lineTo(*point)
+            if box.kind == "line":
+                c.setStrokeColor(box.fill)
+                c.setLineWidth(box.line_width)
+                c.drawPath(path, stroke=1, fill=0)
+            else:
+                path.close()
+                c.setFillColor(box.fill)
+                c.drawPath(path, stroke=0, fill=1)
+        elif box.kind == "rect":
+            # The raster outline grows inwards from the box edges, a PDF stroke is centered on them
+            inset = box.line_width / 2
+            c.setStrokeColor(box.fill)
+            c.setLineWidth(box.line_width)
+            c.rect(x + inset, y + inset, box.width - box.line_width, box.height - box.line_width, stroke=1, fill=0)
+
+        for child in box.children:
+            self.draw(child, x, y)
+
+    def show_page(self):
+        """Finish the current page and start a new one."""
+        self.canvas.showPage()
+        self._begin_page()
+
+    def save(self):
+        """Finish the current page and write the PDF file."""
+        self.canvas.showPage()
+        self.canvas.save()
+
+def write_pdf(box, output_path, dpi):
+    """Write a layout tree (such as a ship sheet) as a single page vector PDF."""
+    renderer = PdfRenderer(output_path, box.width, box.height, dpi)
+    for child in box.children:
+        renderer.draw(child, 0, 0)
+    renderer.save()
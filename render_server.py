@@ -0,0 +1,276 @@
+import argparse
+import hashlib
+import io
+import json
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from PIL import Image
+from ship_creator import layout_ship_sheet, render_ship_sheet, warm_assets, DPI, MIN_DPI
+from layout import canvas_mode, COLOR_MODES
+from system import create_system_image, tile_size, MIN_TILE_WIDTH_PX
+from encoders import encoder_options
+from tile_cache import TileCache
+
+# Encoded image formats the server can return, by query value
+CONTENT_TYPES = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+}
+MAX_BODY_BYTES = 1024 * 1024  # Ship JSONs are a few KB
+MAX_DPI = 1200  # An A5 sheet at 1200 DPI is already about 10000x7000 pixels
+MAX_TILE_WIDTH_PX = 10000
+
+# Names of the JSON types a payload field can be required to have
+_TYPE_NAMES = {dict: "an object", list: "a list", str: "a string", int: "an integer", (int, float, str): "a number or a string"}
+
+def _expect(value, types, field):
+    if not isinstance(value, types):
+        raise ValueError(f"{field} must be {_TYPE_NAMES[types]}")
+
+def check_system(system, field="system"):
+    """Raise ValueError if a system JSON does not have the field types the renderer expects.
+
+    Missing fields are left to the renderer, which reports them as a KeyError.
+    """
+    _expect(system, dict, field)
+    _expect(system.get("name"), str, f"{field}.name")
+    if system.get("rules"):
+        _expect(system["rules"], str, f"{field}.rules")
+    for key in ("circles", "med_bay"):
+        if key in system:
+            _expect(system[key], int, f"{field}.{key}")
+    if system.get("areas"):
+        _expect(system["areas"], list, f"{field}.areas")
+        for index, area in enumerate(system["areas"]):
+            area_field = f"{field}.areas.{index}"
+            _expect(area, dict, area_field)
+            if area.get("description"):
+                _expect(area["description"], str, f"{area_field}.description")
+            if "cost" in area:
+                _expect(area["cost"], dict, f"{area_field}.cost")
+                for key in ("energy", "crew"):
+                    if key in area["cost"]:
+                        _expect(area["cost"][key], int, f"{area_field}.cost.{key}")
+            if "shoot" in area:
+                _expect(area["shoot"], dict, f"{area_field}.shoot")
+                for key in ("damage", "range"):
+                    if key in area["shoot"]:
+                        _expect(area["shoot"][key], (int, float, str), f"{area_field}.shoot.{key}")
+            if "engine" in area:
+                _expect(area["engine"], dict, f"{area_field}.engine")
+                if "speed" in area["engine"]:
+                    _expect(area["engine"]["speed"], (int, float, str), f"{area_field}.engine.speed")
+                if area["engine"].get("steer") is not None:
+                    _expect(area["engine"]["steer"], str, f"{area_field}.engine.steer")
+
+def check_ship(ship):
+    """Raise ValueError if a ship JSON does not have the field types the renderer expects, see check_system."""
+    _expect(ship, dict, "ship")
+    for key in ("title", "subtitle"):
+        if key in ship:
+            _expect(ship[key], str, key)
+    if "shields" in ship:
+        _expect(ship["shields"], dict, "shields")
+        for row in ("front", "rear"):
+            if row in ship["shields"]:
+                _expect(ship["shields"][row], list, f"shields.{row}")
+                for index, value in enumerate(ship["shields"][row]):
+                    _expect(value, int, f"shields.{row}.{index}")
+    for key in ("reactor", "mess"):
+        if key in ship:
+            check_system(ship[key], key)
+    if "sections" in ship:
+        _expect(ship["sections"], dict, "sections")
+        for section in ("left", "right", "core"):
+            if section in ship["sections"]:
+                _expect(ship["sections"][section], list, f"sections.{section}")
+                for index, system in enumerate(ship["sections"][section]):
+                    check_system(system, f"sections.{section}.{index}")
+
+def request_key(kind, payload, params):
+    """Return a canonical hash of a render request, identical requests share the same key."""
+    data = json.dumps({"kind": kind, "payload": payload, "params": params},
+                      sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+class RenderService:
+    """Render ship sheets and system tiles to encoded bytes on a bounded pool of threads.
+
+    Fonts and icons are warmed once and stay loaded for the life of the server. Identical
+    requests arriving while the first one is still rendering wait for its result instead of
+    rendering again.
+    """
+
+    def __init__(self, workers=2, tile_cache=None):
+        self.tile_cache = tile_cache
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render")
+        self.renders = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    def _render(self, kind, payload, params):
+        mode = canvas_mode(params["mode"])
+        if kind == "ship":
+            img = render_ship_sheet(layout_ship_sheet(payload, params["dpi"]), self.tile_cache, mode)
+        else:
+            img = create_system_image(payload, tile_cache=self.tile_cache, dpi=params["dpi"],
+                                      target_width=params["width"], scale=params["scale"], mode=mode)
+        if params["mode"] == "1":
+            img = img.convert("1", dither=Image.Dither.NONE)
+        output = io.BytesIO()
+        img.save(output, **encoder_options(params["format"], quality=params["quality"]))
+        return output.getvalue()
+
+    def _forget(self, key):
+        with self._lock:
+            del self._in_flight[key]
+
+    def submit(self, kind, payload, params):
+        """Return a Future of the encoded image, shared with identical requests still in flight."""
+        key = request_key(kind, payload, params)
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future
+            future = self.executor.submit(self._render, kind, payload, params)
+            self._in_flight[key] = future
+            self.renders += 1
+        future.add_done_callback(lambda _: self._forget(key))
+        return future
+
+    def shutdown(self):
+        """Wait for the renders in progress and stop the pool."""
+        self.executor.shutdown()
+
+def parse_params(kind, query):
+    """Return the render parameters of a request from its query string, raising ValueError if invalid."""
+    def value(name, convert, default=None):
+        values = query.get(name)
+        return convert(values[-1]) if values else default
+
+    params = {
+        "format": value("format", str, "png"),
+        "quality": value("quality", int),
+        "dpi": value("dpi", int, DPI),
+        "mode": value("mode", str, "RGB"),
+    }
+    if params["format"] not in CONTENT_TYPES:
+        raise ValueError(f"Unsupported format {params['format']}, expected one of {', '.join(CONTENT_TYPES)}")
+    if params["quality"] is not None and not 1 <= params["quality"] <= 100:
+        raise ValueError("quality must be between 1 and 100")
+    if not MIN_DPI <= params["dpi"] <= MAX_DPI:
+        raise ValueError(f"dpi must be between {MIN_DPI} and {MAX_DPI}")
+    if params["mode"] not in COLOR_MODES:
+        raise ValueError(f"Unsupported mode {params['mode']}, expected one of {', '.join(COLOR_MODES)}")
+    if kind == "system":
+        params["width"] = value("width", int)
+        params["scale"] = value("scale", float)
+        if params["scale"] is not None and not 0 < params["scale"] < math.inf:
+            raise ValueError("scale must be a positive number")
+        # Bounds the canvas whatever the combination of dpi, width and scale
+        if not MIN_TILE_WIDTH_PX <= tile_size(params["dpi"], params["width"], params["scale"])[0] <= MAX_TILE_WIDTH_PX:
+            raise ValueError(f"tiles must be between {MIN_TILE_WIDTH_PX} and {MAX_TILE_WIDTH_PX}px wide")
+    return params
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    """POST /ship or /system with a JSON body, get the rendered image back.
+
+    Query parameters: format (png or jpg), quality, dpi (MIN_DPI to MAX_DPI), mode (RGB, L for
+    grayscale or 1 for black and white) and, for systems, width or scale (MIN_TILE_WIDTH_PX to
+    MAX_TILE_WIDTH_PX wide). Out of range values and bodies whose fields have the wrong JSON
+    type are rejected with 400.
+    GET /status returns the render and coalescing counters.
+    """
+    service = None  # Set by serve()
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message):
+        self._send(status, json.dumps({"error": message}).encode("utf-8"), "application/json")
+
+    def do_GET(self):
+        if urlparse(self.path).path != "/status":
+            self._send_error(404, "Not found")
+            return
+        status = {"renders": self.service.renders, "coalesced": self.service.coalesced}
+        self._send(200, json.dumps(status).encode("utf-8"), "application/json")
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        kind = url.path.strip("/")
+        if kind not in ("ship", "system"):
+            self._send_error(404, "Not found")
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length < 0:
+                raise ValueError("negative Content-Length")
+            if length > MAX_BODY_BYTES:
+                self._send_error(413, "Request body too large")
+                return
+            payload = json.loads(self.rfile.read(length))
+            params = parse_params(kind, parse_qs(url.query))
+            # Wrongly typed fields would otherwise fail deep inside the render
+            if kind == "ship":
+                check_ship(payload)
+            else:
+                check_system(payload)
+        except ValueError as e:
+            self._send_error(400, f"Invalid request: {str(e)}")
+            return
+
+        try:
+            body = self.service.submit(kind, payload, params).result()
+        except (KeyError, TypeError, ValueError) as e:
+            # Missing or malformed fields in the ship or system JSON
+            self._send_error(400, f"Invalid {kind}: {str(e)}")
+            return
+        except Exception as e:
+            self._send_error(500, f"Error rendering {kind}: {str(e)}")
+            return
+        self._send(200, body, CONTENT_TYPES[params["format"]])
+
+def serve(host="127.0.0.1", port=8765, workers=2, tile_cache=None, dpi=DPI):
+    """Warm the assets and serve render requests until interrupted."""
+    warm_assets(dpi)
+    service = RenderService(workers=workers, tile_cache=tile_cache)
+    handler = type("Handler", (RenderRequestHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"Serving renders on http://{host}:{server.server_address[1]} with {workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve ship sheet and system tile renders over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on (default: 8765)')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1, metavar='N', help='Maximum number of concurrent renders (default: number of CPUs)')
+    parser.add_argument('--dpi', type=int, default=DPI, help=f'Resolution whose assets are preloaded (default: {DPI})')
+    parser.add_argument('--tile-cache', metavar='DIR', help='Reuse rendered system tiles from an on-disk cache in DIR')
+    args = parser.parse_args()
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    tile_cache = TileCache(args.tile_cache) if args.tile_cache else None
+    serve(args.host, args.port, workers=args.workers, tile_cache=tile_cache, dpi=args.dpi)
+
+if __name__ == "__main__":
+    main()
@@ -1,332 +1,997 @@
 import json
-from PIL import Image, ImageDraw, ImageFont
+import math
 import os
-from system import create_system_image
-import argparse
+import io
+import sys
+import contextlib
+import itertools
+from collections import deque
+from system import layout_system, render_tile, tile_size, get_text_size, warm_assets as warm_system_assets, scaled, EUROSTILE_BOLD, TITILLIUM_SEMIBOLD, RESOURCES_DIR
+from layout import Box, text_box, image_box, rasterize, find_boxes, canvas_mode, layer_mode, icon_mode, COLOR_MODES
+from dataclasses import replace
+from PIL import Image
+from assets import get_font, get_icon
+import tracing
+from tracing import span
+from encoders import FORMATS, JPEG_SUBSAMPLING, encoder_options, save_image, BackgroundWriter
 
 # Constants for A5 format (horizontal orientation)
 A5_WIDTH_CM = 21.0  # A5 width in cm
 A5_HEIGHT_CM = 14.8  # A5 height in cm
 DPI = 300
 SYSTEM_SCALE = 0.75  # Scale factor for systems
+MIN_DPI = 19  # Lowest DPI whose Reactor and Mess tiles are at least system.MIN_TILE_WIDTH_PX wide
 
-def get_text_size(draw, text, font):
-    """Calculate the size of text with the given font."""
-    bbox = draw.textbbox((0, 0), text, font=font)
-    return bbox[2] - bbox[0], bbox[3] - bbox[1]
+# Bump whenever a change to the renderer alters the output, so incremental builds redo every sheet.
+# Changes to the tiles also bump system.TILE_RENDERER_VERSION, which the tile cache keys include
+RENDERER_VERSION = 3
 
-def create_ship_sheet(ship_data, output_path):
-    """Create a ship sheet with the given data."""
-    # Calculate pixel dimensions based on DPI
-    width_px = int(round(A5_WIDTH_CM * DPI / 2.54))
-    height_px = int(round(A5_HEIGHT_CM * DPI / 2.54))
+SHIELD_SLOT = os.path.join(RESOURCES_DIR, "shield_slot.png")
+SHIELD_SLOT_ENERGY = os.path.join(RESOURCES_DIR, "shield_slot_energy.png")
+SHIELD_ICON_SIZE = 80
+
+def layout_ship_sheet(ship_data, dpi=DPI):
+    """Lay out a ship sheet without drawing anything.
+
+    Pixel sizes below are given for 300 DPI and scaled to dpi, so low DPI values give cheap drafts.
+    System tiles are laid out directly at the width they take on the sheet. Returns a "sheet" box
+    whose "column" children have the exact height of their stacked tiles.
+    """
+    scale = dpi / DPI
     
-    # Create a white canvas
-    img = Image.new("RGB", (width_px, height_px), "white")
-    draw = ImageDraw.Draw(img)
+    # Calculate pixel dimensions based on DPI
+    width_px = int(round(A5_WIDTH_CM * dpi / 2.54))
+    height_px = int(round(A5_HEIGHT_CM * dpi / 2.54))
+    sheet = Box("sheet", 0, 0, width_px, height_px, name=ship_data["title"])
     
     # Load fonts
-    title_font = ImageFont.truetype("fonts/Eurostile Extended Bold.ttf", 48)
-    subtitle_font = ImageFont.truetype("fonts/TitilliumWeb-SemiBold.ttf", 36)
-    stats_font = ImageFont.truetype("fonts/Eurostile Extended Bold.ttf", 36)
-    shields_font = ImageFont.truetype("fonts/Eurostile Extended Bold.ttf", 28)
+    title_font = get_font(EUROSTILE_BOLD, scaled(48, scale))
+    subtitle_font = get_font(TITILLIUM_SEMIBOLD, scaled(36, scale))
+    stats_font = get_font(EUROSTILE_BOLD, scaled(36, scale))
+    shields_font = get_font(EUROSTILE_BOLD, scaled(28, scale))
     
-    # Draw the ship title
+    header = sheet.add(Box("group", 0, 0, width_px, 0, name="header"))
+    
+    # Ship title
     title_text = ship_data["title"].upper()
-    title_w, title_h = get_text_size(draw, title_text, title_font)
+    title_w, title_h = get_text_size(None, title_text, title_font)
     title_x = (width_px - title_w) // 2
-    title_y = 50
-    draw.text((title_x, title_y), title_text, font=title_font, fill="black")
+    title_y = scaled(50, scale)
+    header.add(text_box(title_x, title_y, title_text, title_font, (title_w, title_h)))
     
-    # Draw the ship subtitle
+    # Ship subtitle
     subtitle_text = ship_data["subtitle"]
-    subtitle_w, subtitle_h = get_text_size(draw, subtitle_text, subtitle_font)
+    subtitle_w, subtitle_h = get_text_size(None, subtitle_text, subtitle_font)
     subtitle_x = (width_px - subtitle_w) // 2
-    subtitle_y = title_y + title_h + 20
-    draw.text((subtitle_x, subtitle_y), subtitle_text, font=subtitle_font, fill="black")
+    subtitle_y = title_y + title_h + scaled(20, scale)
+    header.add(text_box(subtitle_x, subtitle_y, subtitle_text, subtitle_font, (subtitle_w, subtitle_h)))
     
-    # Draw Command-Control values at the edges
+    # Command-Control values at the edges
     command_text = f"COMMAND {ship_data.get('command', 0)}"
     control_text = f"CONTROL {ship_data.get('control', 0)}"
-    command_w, command_h = get_text_size(draw, command_text, stats_font)
-    control_w, control_h = get_text_size(draw, control_text, stats_font)
+    command_w, command_h = get_text_size(None, command_text, stats_font)
+    control_w, control_h = get_text_size(None, control_text, stats_font)
     
     # Position command and control at the edges
-    box_margin = 20  # Margin from bottom of page
+    box_margin = scaled(20, scale)  # Margin from bottom of page
     command_x = box_margin  # Left edge
     control_x = width_px - control_w - box_margin  # Right edge
     command_y = title_y  # Align with title
     control_y = title_y  # Align with title
     
-    draw.text((command_x, command_y), command_text, font=stats_font, fill="black")
-    draw.text((control_x, control_y), control_text, font=stats_font, fill="black")
+    header.add(text_box(command_x, command_y, command_text, stats_font, (command_w, command_h)))
+    header.add(text_box(control_x, control_y, control_text, stats_font, (control_w, control_h)))
+    header.height = subtitle_y + subtitle_h
     
-    # Create bottom boxes
-    box_height = 300  # Increased height for boxes
-    box_margin = 20  # Margin from bottom of page
+    # Bottom boxes
+    box_height = scaled(300, scale)  # Increased height for boxes
+    box_margin = scaled(20, scale)  # Margin from bottom of page
     box_y = height_px - box_height - box_margin
     
     # Calculate box widths (one third of page width each)
     box_width = width_px // 3 - box_margin
     
-    # Generate Reactor and Mess images
-    reactor_img = create_system_image(ship_data["reactor"])
-    mess_img = create_system_image(ship_data["mess"])
-    
-    
-    # Scale images to fit in box
-    scale_factor = (box_width) / max(reactor_img.width, mess_img.width)  # 40px padding
-    new_width = int(reactor_img.width * scale_factor)
-    new_height = int(reactor_img.height * scale_factor)
-    reactor_img = reactor_img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-    
-    new_width = int(mess_img.width * scale_factor)
-    new_height = int(mess_img.height * scale_factor)
-    mess_img = mess_img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+    # Reactor and Mess tiles, sized to fit in box
+    tile_height_px = tile_size(dpi, target_width=box_width)[1]
+    reactor_tile = layout_system(ship_data["reactor"], box_width, tile_height_px, dpi)
+    mess_tile = layout_system(ship_data["mess"], box_width, tile_height_px, dpi)
     
-    # Position reactor at bottom left
-    reactor_x = box_margin
-    reactor_y = height_px - reactor_img.height - box_margin  # 20px from bottom
+    # Reactor at bottom left
+    reactor_y = height_px - reactor_tile.height - box_margin  # 20px from bottom
     
-    # Position mess above reactor
-    mess_x = box_margin
-    mess_y = reactor_y - mess_img.height - 20  # 20px gap between mess and reactor
+    # Mess above reactor
+    mess_y = reactor_y - mess_tile.height - scaled(20, scale)  # 20px gap between mess and reactor
     
-    # Paste images
-    img.paste(mess_img, (mess_x, mess_y))
-    img.paste(reactor_img, (reactor_x, reactor_y))
+    reactor_mess = sheet.add(Box("group", box_margin, mess_y, box_width, height_px - box_margin - mess_y, name="reactor_mess"))
+    reactor_mess.add(replace(mess_tile, x=0, y=0))
+    reactor_mess.add(replace(reactor_tile, x=0, y=reactor_y - mess_y))
     
     # Right box (Shields)
     right_box_x = width_px - box_width - box_margin
+    shields = sheet.add(Box("group", right_box_x, box_y, box_width, box_height, name="shields"))
     
-    # Draw right box border
-    draw.rectangle([(right_box_x, box_y), 
-                   (right_box_x + box_width, box_y + box_height)], 
-                  outline="black", width=8)
+    # Right box border
+    shields.add(Box("rect", 0, 0, box_width, box_height, line_width=scaled(8, scale)))
     
-    # Load shield icons
-    shield_slot_img = Image.open("resources/shield_slot.png")
-    shield_energy_img = Image.open("resources/shield_slot_energy.png")
+    # Shield icons, resized to 80px
+    icon_size = scaled(SHIELD_ICON_SIZE, scale)
+    icon_gap = scaled(4, scale)
     
-    # Resize shield icons to 80px
-    icon_size = 80
-    shield_slot_img = shield_slot_img.resize((icon_size, icon_size), Image.Resampling.LANCZOS)
-    shield_energy_img = shield_energy_img.resize((icon_size, icon_size), Image.Resampling.LANCZOS)
-    
-    # Create shield displays
+    # Shield displays
     shield_data = ship_data.get("shields", {"front": [0, 0, 0], "rear": [0, 0]})
     front_shields = shield_data.get("front", [0, 0, 0])
     rear_shields = shield_data.get("rear", [0, 0])
     
     # Calculate total height needed for each shield group (label + icons)
-    label_height = 40  # Height for label
+    label_height = scaled(40, scale)  # Height for label
     shield_group_height = label_height + icon_size
     
     # Calculate vertical spacing to center both groups in box
     total_height = shield_group_height * 2  # Two groups
-    start_y = box_y + (box_height - total_height) // 2
-    
-    # Draw front shields
-    front_y = start_y - 10
-    front_label = "FRONT SHIELDS"
-    front_label_w, _ = get_text_size(draw, front_label, shields_font)
-    front_label_x = right_box_x + (box_width - front_label_w) // 2
-    draw.text((front_label_x, front_y), front_label, font=shields_font, fill="black")
-    front_y += label_height
-    
-    # Calculate total width of front shields
-    front_shields_width = (len(front_shields) + sum(front_shields)) * (icon_size + 4) - 4  # -4 to remove last gap
-    current_x = right_box_x + (box_width - front_shields_width) // 2
-    
-    for shield_value in front_shields:
-        # Draw empty shield slots
-        for _ in range(shield_value):
-            img.paste(shield_slot_img, (current_x, front_y), shield_slot_img)
-            current_x += icon_size + 4
+    start_y = (box_height - total_height) // 2
+    
+    shield_rows = [
+        ("FRONT SHIELDS", front_shields, start_y - scaled(10, scale)),
+        ("REAR SHIELDS", rear_shields, start_y + shield_group_height + scaled(10, scale)),
+    ]
+    for label, shield_values, row_y in shield_rows:
+        label_size = get_text_size(None, label, shields_font)
+        label_x = (box_width - label_size[0]) // 2
+        shields.add(text_box(label_x, row_y, label, shields_font, label_size))
+        row_y += label_height
         
-        # Draw one energy slot
-        img.paste(shield_energy_img, (current_x, front_y), shield_energy_img)
-        current_x += icon_size + 4
-    
-    # Draw rear shields
-    rear_y = start_y + shield_group_height + 10
-    rear_label = "REAR SHIELDS"
-    rear_label_w, _ = get_text_size(draw, rear_label, shields_font)
-    rear_label_x = right_box_x + (box_width - rear_label_w) // 2
-    draw.text((rear_label_x, rear_y), rear_label, font=shields_font, fill="black")
-    rear_y += label_height
-    
-    # Calculate total width of rear shields
-    rear_shields_width = (len(rear_shields) + sum(rear_shields)) * (icon_size + 4) - 4  # -4 to remove last gap
-    current_x = right_box_x + (box_width - rear_shields_width) // 2
-    
-    for shield_value in rear_shields:
-        # Draw empty shield slots
-        for _ in range(shield_value):
-            img.paste(shield_slot_img, (current_x, rear_y), shield_slot_img)
-            current_x += icon_size + 4
+        # Calculate total width of the shields
+        shields_width = shield_strip_width(shield_values, scale)
+        current_x = (box_width - shields_width) // 2
         
-        # Draw one energy slot
-        img.paste(shield_energy_img, (current_x, rear_y), shield_energy_img)
-        current_x += icon_size + 4
+        for shield_value in shield_values:
+            # Empty shield slots
+            for _ in range(shield_value):
+                shields.add(image_box(current_x, row_y, SHIELD_SLOT, (icon_size, icon_size)))
+                current_x += icon_size + icon_gap
+            
+            # One energy slot
+            shields.add(image_box(current_x, row_y, SHIELD_SLOT_ENERGY, (icon_size, icon_size)))
+            current_x += icon_size + icon_gap
     
     # Start systems below subtitle
-    current_y = subtitle_y + subtitle_h + 50  # 50px margin from subtitle
+    current_y = subtitle_y + subtitle_h + scaled(50, scale)  # 50px margin from subtitle
     
-    # Create three columns for systems
-    column_margin = 8  # Space between columns
-    side_margin = 16  # Space from edges of page
+    # Three columns for systems
+    column_margin = scaled(8, scale)  # Space between columns
+    side_margin = scaled(16, scale)  # Space from edges of page
     
     # Calculate column width to ensure proper centering
     available_width = width_px - (2 * side_margin) - (2 * column_margin)  # Total width minus margins
     column_width = available_width // 3
     
-    # Calculate system tile dimensions (no scaling)
+    # System tile dimensions (no scaling)
     system_width = column_width
+    system_height = tile_size(dpi, target_width=system_width)[1]
     
-    # Add column labels
-    label_font = ImageFont.truetype("fonts/Eurostile Extended Bold.ttf", 24)
-    label_spacing = 20  # Space between label and columns
+    # Column labels
+    label_font = get_font(EUROSTILE_BOLD, scaled(24, scale))
+    label_spacing = scaled(20, scale)  # Space between label and columns
     
     # Calculate total width of all columns including margins
     total_columns_width = (3 * column_width) + (2 * column_margin)
     start_x = (width_px - total_columns_width) // 2
     
-    # Draw column labels
-    labels = ["LEFT", "CENTER", "RIGHT"]
-    for i, label in enumerate(labels):
-        label_w, label_h = get_text_size(draw, label, label_font)
+    labels = sheet.add(Box("group", 0, current_y, width_px, 0, name="labels"))
+    for i, label in enumerate(["LEFT", "CENTER", "RIGHT"]):
+        label_w, label_h = get_text_size(None, label, label_font)
         label_x = start_x + (i * (column_width + column_margin)) + (column_width - label_w) // 2
-        label_y = current_y
-        draw.text((label_x, label_y), label, font=label_font, fill="black")
+        labels.add(text_box(label_x, 0, label, label_font, (label_w, label_h)))
+    labels.height = label_h
     
     # Move columns down to account for labels
     current_y += label_h + label_spacing
     
-    # Draw systems in columns
-    current_y_columns = current_y
-    
-    # Prepare core column without Reactor and Mess
-    core_systems = ship_data["sections"]["core"].copy()
-    
-    # First pass: generate all system images and calculate heights
-    system_images = {}  # Store generated images
-    column_heights = []
-    
-    # Process left and right columns
-    for section in ["left", "right"]:
+    # Tiles are shared between systems with the same name
+    system_tiles = {}
+    
+    def system_tile(system):
+        if system["name"] not in system_tiles:
+            system_tiles[system["name"]] = layout_system(system, system_width, system_height, dpi)
+        return system_tiles[system["name"]]
+    
+    # Left and right columns, then the core column without the Mess (it is handled separately)
+    column_x = {
+        "left": start_x,
+        "right": start_x + 2 * (column_width + column_margin),
+        "core": start_x + column_width + column_margin,
+    }
+    for section in ["left", "right", "core"]:
+        column = sheet.add(Box("column", column_x[section], current_y, column_width, 0, name=section))
         column_height = 0
         for system in ship_data["sections"][section]:
-            # Generate the system image if not already generated
-            if system["name"] not in system_images:
-                system_img = create_system_image(system)
-                # Scale the image to match our desired width
-                scale_factor = system_width / system_img.width
-                new_height = int(system_img.height * scale_factor)
-                system_img = system_img.resize((system_width, new_height), Image.Resampling.LANCZOS)
-                system_images[system["name"]] = system_img
-            column_height += system_images[system["name"]].height + column_margin
-        column_heights.append(column_height - column_margin)  # Remove last margin
-    
-    # Process core column
-    core_height = 0
-    for system in core_systems:
-        # Skip if this is a Mess system (it's handled separately)
-        if system["name"].lower() == "mess":
+            if section == "core" and system["name"].lower() == "mess":
+                continue
+            tile = system_tile(system)
+            column.add(replace(tile, x=0, y=column_height))
+            column_height += tile.height + column_margin
+        column.height = max(column_height - column_margin, 0)  # Remove last margin
+    
+    return sheet
+
+def shield_strip_width(shield_values, scale=1.0):
+    """Return the width of a row of shield icons: one slot per shield point plus one energy slot per shield."""
+    icon_size = scaled(SHIELD_ICON_SIZE, scale)
+    icon_gap = scaled(4, scale)
+    return (len(shield_values) + sum(shield_values)) * (icon_size + icon_gap) - icon_gap  # Remove last gap
+
+def check_ship_sheet(ship_data, dpi=DPI):
+    """Find the parts of a ship sheet that overflow, from its layout alone.
+
+    Nothing is drawn: tile and column heights come from text metrics and icon sizes. Returns a
+    list of (part, obstacle, overflow in pixels) tuples, empty when the sheet fits.
+    """
+    sheet = layout_ship_sheet(ship_data, dpi)
+    groups = {box.name: box for box in sheet.children}
+    obstacles = [(groups["reactor_mess"], "Reactor/Mess"), (groups["shields"], "shield box")]
+    problems = []
+
+    # Columns must end above whatever bottom box sits under them, and above the page bottom
+    for column in find_boxes(sheet, "column"):
+        column, column_x, column_y = column
+        bottom = column_y + column.height
+        limit, obstacle = sheet.height, "page bottom"
+        for box, name in obstacles:
+            overlaps = box.x < column_x + column.width and column_x < box.x + box.width
+            if overlaps and box.y < limit:
+                limit, obstacle = box.y, name
+        if bottom > limit:
+            problems.append((f"{column.name} column", obstacle, int(bottom - limit)))
+
+    # Shield strips must fit across the shield box
+    scale = dpi / DPI
+    shield_data = ship_data.get("shields", {"front": [0, 0, 0], "rear": [0, 0]})
+    for row in ["front", "rear"]:
+        strip_width = shield_strip_width(shield_data.get(row, [0, 0, 0] if row == "front" else [0, 0]), scale)
+        if strip_width > groups["shields"].width:
+            problems.append((f"{row} shields", "shield box", strip_width - groups["shields"].width))
+
+    return problems
+
+def check_ships(json_paths, dpi=DPI):
+    """Print the overflowing parts of every ship sheet and return the number of ships that overflow."""
+    failed = 0
+    for json_path in json_paths:
+        try:
+            with open(json_path, "r") as f:
+                ship_data = json.load(f)
+            problems = check_ship_sheet(ship_data, dpi)
+        except Exception as e:
+            print(f"Error processing {json_path}: {str(e)}")
+            failed += 1
             continue
-        # Generate the system image if not already generated
-        if system["name"] not in system_images:
-            system_img = create_system_image(system)
-            # Scale the image to match our desired width
-            scale_factor = system_width / system_img.width
-            new_height = int(system_img.height * scale_factor)
-            system_img = system_img.resize((system_width, new_height), Image.Resampling.LANCZOS)
-            system_images[system["name"]] = system_img
-        core_height += system_images[system["name"]].height + column_margin
-    core_height -= column_margin  # Remove last margin
-    column_heights.insert(1, core_height)  # Insert core height in the middle
-    
-    # Draw each column independently
-    for col_idx, section in enumerate(["left", "right"]):
-        # Calculate x position based on column index
-        current_x = start_x + (col_idx * 2 * (column_width + column_margin))
-        
-        # Start at the top with margin
-        current_y = current_y_columns
+
+        for part, obstacle, overflow in problems:
+            print(f"{json_path}: {part} overflows the {obstacle} by {overflow}px")
+        if problems:
+            failed += 1
+
+    print(f"{failed} of {len(json_paths)} ships overflow" if failed else f"All {len(json_paths)} ships fit")
+    return failed
+
+def render_ship_sheet(sheet, tile_cache=None, mode="RGB", tile_pool=None):
+    """Rasterize a ship sheet laid out by layout_ship_sheet on a canvas of the given mode, optionally reusing system tiles from a TileCache.
+
+    With a tile_pool.TilePool, the tiles are drawn in its worker processes instead. A system
+    placed several times on the sheet is drawn once and pasted at each of its places.
+    """
+    if tile_pool is not None:
+        return tile_pool.render_sheet(sheet, mode)
+
+    # Copies of a shared tile placed by layout_ship_sheet share the data dict of its layout
+    tile_images = {}
+
+    def shared_tile(tile):
+        if id(tile.data) not in tile_images:
+            tile_images[id(tile.data)] = render_tile(tile, tile_cache, mode)
+        return tile_images[id(tile.data)]
+
+    return rasterize(sheet, mode, render_tile=shared_tile)
+
+def sheet_size(dpi):
+    """Return the (width, height) in pixels of a ship sheet at dpi."""
+    return int(round(A5_WIDTH_CM * dpi / 2.54)), int(round(A5_HEIGHT_CM * dpi / 2.54))
+
+def pyramid_path(output_path, dpi):
+    """Return the path of a sheet downsampled to dpi, e.g. ships/starliner_150dpi.jpg."""
+    base, extension = os.path.splitext(output_path)
+    return f"{base}_{dpi}dpi{extension}"
+
+def sheet_outputs(output_path, dpi=DPI, pyramid=()):
+    """Return the (dpi, path, (width, height)) of a sheet and of each smaller size in pyramid, largest first."""
+    outputs = [(dpi, output_path, sheet_size(dpi))]
+    for level in sorted(set(pyramid), reverse=True):
+        outputs.append((level, pyramid_path(output_path, level), sheet_size(level)))
+    return outputs
+
+def downsample(img, size):
+    """Shrink img to size: by the largest whole factor with Image.reduce, then with a box filter for the rest."""
+    factor = min(img.width // size[0], img.height // size[1])
+    if factor >= 2:
+        img = img.reduce(factor)
+    if img.size != size:
+        img = img.resize(size, Image.BOX)
+    return img
+
+def save_sheet(img, outputs, encoder=None, output_files=None, color_mode="RGB"):
+    """Save a rendered sheet to each of its outputs (see sheet_outputs), from the largest size down.
+
+    Each smaller size is downsampled in memory from the previous one, so the sheet is rendered
+    and decoded only once. With output_files (one binary file object per output) the images are
+    written to them instead of to the output paths. A "1" color_mode thresholds each size of
+    the grayscale sheet to pure black and white just before it is encoded.
+    """
+    for index, (level, path, size) in enumerate(outputs):
+        if img.size != size:
+            with span("downsample", dpi=level):
+                img = downsample(img, size)
+        output = img.convert("1", dither=Image.Dither.NONE) if color_mode == "1" else img
+        with span("encode", path=path):
+            save_image(output, path if output_files is None else output_files[index], encoder)
+
+def create_ship_sheet(ship_data, output_path, tile_cache=None, dpi=DPI, encoder=None, output_files=None, pyramid=(),
+                      color_mode="RGB", tile_pool=None):
+    """Create a ship sheet with the given data, optionally reusing system tiles from a TileCache.
+
+    A path ending in .pdf writes a vector PDF instead of a raster image, otherwise the image is
+    saved with the encoder options from encoders.encoder_options, along with a copy downsampled
+    to each smaller DPI in pyramid. When output_files (binary file objects, one per output of
+    sheet_outputs) are given, the sheets are written to them instead and output_path only names
+    their format. Raster sheets are drawn in color_mode (see layout.COLOR_MODES), with their
+    tiles drawn in parallel when a tile_pool.TilePool is given.
+    """
+    ship = ship_data.get("title")
+    with span("layout_ship_sheet", ship=ship):
+        sheet = layout_ship_sheet(ship_data, dpi)
+    
+    if os.path.splitext(output_path)[1].lower() == ".pdf":
+        # Only load reportlab when a PDF is requested
+        from pdf_backend import write_pdf
+        with span("write_pdf", ship=ship):
+            write_pdf(sheet, output_path if output_files is None else output_files[0], dpi)
+        outputs = sheet_outputs(output_path, dpi)
+    else:
+        img = render_ship_sheet(sheet, tile_cache, canvas_mode(color_mode), tile_pool)
+
+        # Save the final image and its smaller sizes
+        outputs = sheet_outputs(output_path, dpi, pyramid)
+        save_sheet(img, outputs, encoder, output_files, color_mode)
+    if output_files is None:
+        for _, path, _ in outputs:
+            print(f"Saved ship sheet to: {path}")
+
+def warm_assets(dpi=DPI, mode="RGB"):
+    """Preload every font and icon used to render ship sheets at the given DPI on canvases of the given mode."""
+    scale = dpi / DPI
+    width_px = int(round(A5_WIDTH_CM * dpi / 2.54))
+    box_width = width_px // 3 - scaled(20, scale)
+    column_width = (width_px - 2 * scaled(16, scale) - 2 * scaled(8, scale)) // 3
+    warm_system_assets(dpi, target_width=box_width, mode=mode)
+    warm_system_assets(dpi, target_width=column_width, mode=mode)
+    for size in (48, 36, 28, 24):
+        get_font(EUROSTILE_BOLD, scaled(size, scale))
+    get_font(TITILLIUM_SEMIBOLD, scaled(36, scale))
+    get_icon(SHIELD_SLOT, scaled(SHIELD_ICON_SIZE, scale), mode=icon_mode(mode))
+    get_icon(SHIELD_SLOT_ENERGY, scaled(SHIELD_ICON_SIZE, scale), mode=icon_mode(mode))
+
+def ship_json_paths(ships_dir):
+    """Return the paths of the ship JSON files in ships_dir, sorted so batch output is deterministic.
+
+    Hidden files such as the build manifest are skipped.
+    """
+    return [os.path.join(ships_dir, f) for f in sorted(os.listdir(ships_dir)) if f.endswith('.json') and not f.startswith('.')]
+
+def ship_output_path(ship_data, output_dir, output_format="jpg"):
+    """Return the sheet path of a ship, named after its title."""
+    ship_name = ship_data["title"].lower().replace(" ", "_")
+    return os.path.join(output_dir, f"{ship_name}.{output_format}")
+
+def render_ship(source, ship_data, output_path, tile_cache=None, dpi=DPI, encoder=None, to_bytes=False, pyramid=(),
+                color_mode="RGB", tile_pool=None):
+    """Create one ship sheet and return everything it printed, whether it succeeded and its encoded bytes.
+
+    The output is captured so batch runs can report it in order. The bytes are None unless
+    to_bytes is set, in which case the sheets are encoded in memory instead of saved, and
+    returned as a list with the bytes of each output of sheet_outputs.
+    """
+    log = io.StringIO()
+    ok = True
+    output_files = None
+    if to_bytes:
+        output_files = [io.BytesIO() for _ in sheet_outputs(output_path, dpi, pyramid)]
+    with contextlib.redirect_stdout(log):
+        try:
+            create_ship_sheet(ship_data, output_path, tile_cache=tile_cache, dpi=dpi, encoder=encoder,
+                              output_files=output_files, pyramid=pyramid, color_mode=color_mode, tile_pool=tile_pool)
+        except Exception as e:
+            print(f"Error processing {source}: {str(e)}")
+            ok = False
+    data = [output_file.getvalue() for output_file in output_files] if ok and to_bytes else None
+    return log.getvalue(), ok, data
+
+def _save_rendered_ship(source, log, img, outputs, encoder, to_bytes=False, color_mode="RGB"):
+    """Encode a rendered sheet on the BackgroundWriter, returning the ship's full log, success and encoded bytes."""
+    output_files = [io.BytesIO() for _ in outputs] if to_bytes else None
+    try:
+        save_sheet(img, outputs, encoder, output_files, color_mode)
+    except Exception as e:
+        return log + f"Error processing {source}: {str(e)}\n", False, 0, 0, [], None
+    # Spans of this thread are already recorded in this process
+    if to_bytes:
+        return log, True, 0, 0, [], [output_file.getvalue() for output_file in output_files]
+    return log + "".join(f"Saved ship sheet to: {path}\n" for _, path, _ in outputs), True, 0, 0, [], None
+
+def render_ship_pipelined(source, ship_data, output_path, writer, tile_cache=None, dpi=DPI, encoder=None, to_bytes=False,
+                          pyramid=(), color_mode="RGB", tile_pool=None):
+    """Render a raster ship sheet and queue its encoding on a BackgroundWriter.
+
+    Returns a Future of (log, success, 0, 0, [], bytes) like _render_in_worker, or the
+    (log, success, None) of render_ship when the sheet failed to render. Nothing is printed
+    from the writer thread, since stdout is only captured on this one.
+    """
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        try:
+            with span("layout_ship_sheet", ship=source):
+                sheet = layout_ship_sheet(ship_data, dpi)
+            img = render_ship_sheet(sheet, tile_cache, canvas_mode(color_mode), tile_pool)
+        except Exception as e:
+            print(f"Error processing {source}: {str(e)}")
+            return log.getvalue(), False, None
+    return writer.submit(_save_rendered_ship, source, log.getvalue(), img, sheet_outputs(output_path, dpi, pyramid), encoder, to_bytes,
+                         color_mode)
+
+# Tile cache of the current worker process, see _init_worker
+_worker_tile_cache = None
+
+def _init_worker(tile_cache_dir, tile_cache_max_bytes, dpi, trace=False, memory_tiles=0, mode="RGB"):
+    """Set up a batch worker process: warm its fonts and icons and open the tile caches."""
+    global _worker_tile_cache
+    from tile_cache import TileCache, MemoryTileCache
+
+    if trace:
+        tracing.enable()
+    with span("warm_assets"):
+        warm_assets(dpi, mode)
+    if tile_cache_dir:
+        _worker_tile_cache = TileCache(tile_cache_dir, max_bytes=tile_cache_max_bytes)
+    if memory_tiles:
+        _worker_tile_cache = MemoryTileCache(memory_tiles, backing=_worker_tile_cache)
+
+def _render_in_worker(source, ship_data, output_path, dpi, encoder, to_bytes=False, pyramid=(), color_mode="RGB"):
+    """Render a ship in a worker process, returning its log, success, the tile cache hits and misses, its trace events and encoded bytes."""
+    cache = _worker_tile_cache
+    hits, misses = (cache.hits, cache.misses) if cache else (0, 0)
+    log, ok, data = render_ship(source, ship_data, output_path, tile_cache=cache, dpi=dpi, encoder=encoder, to_bytes=to_bytes,
+                                pyramid=pyramid, color_mode=color_mode)
+    if cache:
+        hits, misses = cache.hits - hits, cache.misses - misses
+    return log, ok, hits, misses, tracing.collect(), data
+
+def render_batch(json_paths, output_dir, jobs=1, tile_cache=None, manifest=None, dpi=DPI, output_format="jpg", encoder=None,
+                 memory_tiles=0, archive=None, pyramid=(), color_mode="RGB", tile_pool=None, force=False):
+    """Render the ship sheets for a list of JSON files, using up to jobs worker processes.
+
+    json_paths can be any iterable and may also hold (source, ship data, output path) tuples for
+    ships that do not come from a file, such as template variants or bundle records; it is
+    consumed lazily. A None output path names the sheet after the ship title, and ship data
+    that is an exception (a record that could not be read) is reported as an error.
+    Results are printed in input order. At most 2 * jobs ships are in flight at any time,
+    so memory use does not grow with the size of the batch. When a BuildManifest is given,
+    ships whose JSON and assets have not changed since the last build are skipped, unless force
+    is set, and every rendered ship is recorded in it. A serial
+    batch encodes each raster sheet on a BackgroundWriter while the next one renders.
+    With memory_tiles, each process keeps that many rendered tiles in memory so systems shared
+    between ships are only drawn once. With an archive.ArchiveWriter, sheets are encoded in
+    memory and appended to the archive in input order instead of being saved to output_dir.
+    pyramid lists smaller DPIs each sheet is also saved at, downsampled from the full render,
+    and color_mode is the color mode the sheets are drawn in. A serial batch can draw the tiles
+    of each sheet in the worker processes of a tile_pool.TilePool.
+    """
+    # The caches and hashing of batch runs only load for them, keeping single ship runs quick to start
+    from tile_cache import MemoryTileCache, system_hash
+    from build_manifest import file_hash
+
+    executor = None
+    writer = None
+    if jobs > 1:
+        # The process pool machinery only loads for parallel batches, keeping single ship runs quick to start
+        from concurrent.futures import ProcessPoolExecutor
+        cache_dir = tile_cache.cache_dir if tile_cache else None
+        cache_max_bytes = tile_cache.max_bytes if tile_cache else 0
+        executor = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                       initargs=(cache_dir, cache_max_bytes, dpi, tracing.enabled(), memory_tiles,
+                                                 canvas_mode(color_mode)))
+    elif output_format in FORMATS:
+        writer = BackgroundWriter()
+    if memory_tiles and executor is None:
+        tile_cache = MemoryTileCache(memory_tiles, backing=tile_cache)
+    
+    to_bytes = archive is not None
+    max_in_flight = 2 * jobs
+    pending = deque()  # (output path, record, future or finished result) in input order
+    hits = misses = 0
+    skipped = 0
+    warmed = False
+
+    def report_oldest():
+        nonlocal hits, misses
+        _, record, result = pending.popleft()
+        if isinstance(result, tuple):
+            log, ok, data = result
+        else:
+            log, ok, job_hits, job_misses, events, data = result.result()
+            tracing.add_events(events)
+            hits += job_hits
+            misses += job_misses
+        print(log, end="")
+        if not ok or record is None:
+            return
+        source, json_hash, output_path, title = record
+        outputs = sheet_outputs(output_path, dpi, pyramid)
+        if archive is not None:
+            for (level, path, size), blob in zip(outputs, data):
+                name = archive.add(path, blob, title=title, source=source, json_hash=json_hash,
+                                   dpi=level, width=size[0], height=size[1])
+                print(f"Added ship sheet to {archive.path}: {name}")
+        if manifest is not None:
+            manifest.record(source, json_hash, output_path,
+                            sizes=[{"dpi": level, "output": path, "width": size[0], "height": size[1]} for level, path, size in outputs])
+
+    def wait_for_output(output_path):
+        # Ships sharing a title write the same file: let the earlier one finish first so the last one wins.
+        # Archive members are renamed instead, so they do not need to wait
+        while archive is None and any(path == output_path for path, _, _ in pending):
+            report_oldest()
+
+    try:
+        for json_path in json_paths:
+            if not isinstance(json_path, str):
+                source, ship_data, output_path = json_path
+                try:
+                    if isinstance(ship_data, Exception):
+                        raise ship_data
+                    if output_path is None:
+                        output_path = ship_output_path(ship_data, output_dir, output_format)
+                except Exception as e:
+                    pending.append((None, None, (f"Error processing {source}: {str(e)}\n", False, None)))
+                    continue
+                json_hash = system_hash(ship_data) if manifest is not None or to_bytes else None
+                if manifest is not None and not force and manifest.is_up_to_date(source, json_hash):
+                    skipped += 1
+                    continue
+            else:
+                source = os.path.basename(json_path)
+                try:
+                    # Skip ships built from the same inputs as their existing sheet
+                    json_hash = None
+                    if manifest is not None or to_bytes:
+                        json_hash = file_hash(json_path)
+                    if manifest is not None and not force and manifest.is_up_to_date(source, json_hash):
+                        skipped += 1
+                        continue
+
+                    # Load ship data
+                    with open(json_path, "r") as f:
+                        ship_data = json.load(f)
+                    output_path = ship_output_path(ship_data, output_dir, output_format)
+                except Exception as e:
+                    pending.append((None, None, (f"Error processing {source}: {str(e)}\n", False, None)))
+                    continue
+
+            if to_bytes:
+                # Archive members are named after the sheet file, without its directory
+                output_path = os.path.basename(output_path)
+            record = (source, json_hash, output_path, ship_data.get("title"))
+            if executor is None:
+                if not warmed:
+                    # Load fonts and icons once for the whole batch
+                    with span("warm_assets"):
+                        warm_assets(dpi, canvas_mode(color_mode))
+                    warmed = True
+                if writer is None:
+                    result = render_ship(source, ship_data, output_path, tile_cache=tile_cache, dpi=dpi, encoder=encoder,
+                                         to_bytes=to_bytes, pyramid=pyramid, color_mode=color_mode, tile_pool=tile_pool)
+                else:
+                    wait_for_output(output_path)
+                    result = render_ship_pipelined(source, ship_data, output_path, writer, tile_cache=tile_cache, dpi=dpi,
+                                                   encoder=encoder, to_bytes=to_bytes, pyramid=pyramid, color_mode=color_mode,
+                                                   tile_pool=tile_pool)
+                pending.append((output_path, record, result))
+            else:
+                wait_for_output(output_path)
+                while len(pending) >= max_in_flight:
+                    report_oldest()
+                with span("submit", ship=source):
+                    future = executor.submit(_render_in_worker, source, ship_data, output_path, dpi, encoder, to_bytes, pyramid,
+                                             color_mode)
+                pending.append((output_path, record, future))
+            
+            while pending and (isinstance(pending[0][2], tuple) or pending[0][2].done()):
+                report_oldest()
         
+        while pending:
+            report_oldest()
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        if writer is not None:
+            writer.close()
+        if manifest is not None:
+            manifest.save()
+    
+    if skipped:
+        print(f"Skipped {skipped} unchanged ships")
+    if tile_cache is not None:
+        tile_cache.evict()
+        hits += tile_cache.hits
+        misses += tile_cache.misses
+    if tile_pool is not None:
+        hits += tile_pool.hits
+        misses += tile_pool.misses
+    if tile_cache is not None or memory_tiles:
+        print(f"Tile cache: {hits} hits, {misses} misses")
+
+def template_variants(template_path, output_dir, output_format="jpg", limit=None):
+    """Yield the (source, ship data, output path) of each variant of a template, for render_batch.
+
+    Variants are expanded one at a time. The parameter values of each variant are appended to
+    variants.jsonl in output_dir as it is generated, so sheets can be traced back to them.
+    """
+    from templates import load_template, expand
+
+    template = load_template(template_path)
+    name = os.path.splitext(os.path.basename(template_path))[0]
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "variants.jsonl"), "w") as index_file:
+        for index, params, ship_data in itertools.islice(expand(template), limit):
+            output_path = os.path.join(output_dir, f"{name}_{index:05d}.{output_format}")
+            index_file.write(json.dumps({"index": index, "title": ship_data.get("title"),
+                                         "output": output_path, "params": params}) + "\n")
+            yield f"{name}#{index}", ship_data, output_path
+
+def bundle_ships(bundle_path):
+    """Yield the (source, ship data, None) of each record of a bundle file, for render_batch."""
+    from bundle import iter_bundle
+
+    name = os.path.basename(bundle_path)
+    for line, ship_data in iter_bundle(bundle_path):
+        yield f"{name} line {line}", ship_data, None
+
+def ship_tiles(ship_data):
+    """Return the systems of a ship printed as individual tiles: reactor, mess, then each section.
+
+    Systems sharing a name are printed once, like they share a tile on the sheet.
+    """
+    systems = {}
+    for system in [ship_data["reactor"], ship_data["mess"]]:
+        systems.setdefault(system["name"], system)
+    for section in ["left", "right", "core"]:
         for system in ship_data["sections"][section]:
-            system_img = system_images[system["name"]]
-            img.paste(system_img, (current_x, current_y))
-            current_y += system_img.height + column_margin
-    
-    # Draw core column
-    current_x = start_x + column_width + column_margin
-    
-    # Start at the top with margin
-    current_y = current_y_columns
-    
-    for system in core_systems:
-        system_img = system_images[system["name"]]
-        img.paste(system_img, (current_x, current_y))
-        current_y += system_img.height + column_margin
-    
-    # Save the final image
-    img.save(output_path)
-    print(f"Saved ship sheet to: {output_path}")
+            systems.setdefault(system["name"], system)
+    return list(systems.values())
+
+def impose_ships(json_paths, output_path, page="A4", per_page=2, tiles=False, gutter_mm=10, tile_cache=None, dpi=DPI,
+                 mode="RGB"):
+    """Print ship sheets (or their individual system tiles) several to a page in a multi-page PDF or TIFF.
+
+    Sheets are rendered at the DPI that fits per_page of them on a page, tiles at their nominal
+    8cm width. Each page is written as soon as it is full, so only one page and one sheet are
+    held in memory however many ships are printed. Pages and items are drawn in mode ("RGB" or "L").
+    """
+    # Only import the imposition writers when printing
+    from imposition import Imposer, fit_grid, open_page_writer
+
+    if tiles:
+        landscape, item_dpi = False, dpi
+    else:
+        a5_size = (int(round(A5_WIDTH_CM * dpi / 2.54)), int(round(A5_HEIGHT_CM * dpi / 2.54)))
+        landscape, scale = fit_grid(page, dpi, a5_size, per_page, gutter_mm)
+        item_dpi = math.floor(dpi * scale)  # Rounded down so the sheets never outgrow their grid cell
+        if item_dpi < MIN_DPI:
+            print(f"Error: {per_page} sheets per {page} page would be drawn at {item_dpi} DPI, below the {MIN_DPI} DPI minimum")
+            return
+
+    warm_assets(item_dpi, mode)
+    imposer = Imposer(open_page_writer(output_path, dpi), page, dpi, landscape=landscape, gutter_mm=gutter_mm, mode=mode)
+    items = 0
+    try:
+        for json_path in json_paths:
+            try:
+                with open(json_path, "r") as f:
+                    ship_data = json.load(f)
+
+                if tiles:
+                    for system in ship_tiles(ship_data):
+                        imposer.add(render_tile(layout_system(system, *tile_size(item_dpi), item_dpi), tile_cache, mode))
+                        items += 1
+                else:
+                    imposer.add(render_ship_sheet(layout_ship_sheet(ship_data, item_dpi), tile_cache, mode))
+                    items += 1
+            except Exception as e:
+                print(f"Error processing {json_path}: {str(e)}")
+    finally:
+        imposer.close()
+
+    kind = "tiles" if tiles else "ship sheets"
+    print(f"Imposed {items} {kind} on {imposer.pages} {page} pages: {output_path}")
+
+def export_atlas(json_paths, output_dir, page_size=None, tile_cache=None, dpi=DPI, mode="RGB"):
+    """Render the system tiles of the ships as cards packed into atlas pages, with a JSON index (see atlas.py).
+
+    Tiles are rendered at their nominal 8cm width, in mode ("RGB" or "L", which gives LA pages).
+    Systems that are identical across ships (same JSON) are rendered once and share a single
+    slot of the atlas.
+    """
+    # Only import the atlas packer when exporting
+    from atlas import write_atlas, ATLAS_SIZE
+    from tile_cache import system_hash
+
+    tile_width_px, tile_height_px = tile_size(dpi)
+    tiles = []  # (system name, laid out tile) of each distinct system
+    slots = {}  # Index in tiles, by system hash
+    entries = []
+    for json_path in json_paths:
+        try:
+            with open(json_path, "r") as f:
+                ship_data = json.load(f)
+
+            # Every system printed on the sheet; the Mess listed in the core is the one at the bottom
+            systems = [("reactor", ship_data["reactor"]), ("mess", ship_data["mess"])]
+            for section in ["left", "right", "core"]:
+                systems += [(section, system) for system in ship_data["sections"][section]
+                            if not (section == "core" and system["name"].lower() == "mess")]
+
+            ship_entries = []
+            for section, system in systems:
+                key = system_hash(system, tile_width_px=tile_width_px, tile_height_px=tile_height_px)
+                if key not in slots:
+                    slots[key] = len(tiles)
+                    tiles.append((system["name"], layout_system(system, tile_width_px, tile_height_px, dpi)))
+                ship_entries.append({"ship": ship_data["title"], "source": os.path.basename(json_path),
+                                     "section": section, "system": system["name"], "tile": slots[key]})
+            entries += ship_entries
+        except Exception as e:
+            print(f"Error processing {json_path}: {str(e)}")
+
+    index_path, pages = write_atlas(tiles, entries, output_dir, lambda tile: render_tile(tile, tile_cache, mode),
+                                    page_size or ATLAS_SIZE, mode=layer_mode(mode))
+    print(f"Packed {len(tiles)} distinct tiles of {len(entries)} systems on {pages} atlas pages: {index_path}")
 
 def main():
+    import argparse
+    from tile_cache import TileCache
+    from build_manifest import BuildManifest, MANIFEST_NAME
+    from assets import asset_fingerprint
+
     # Set up argument parser
     parser = argparse.ArgumentParser(description='Generate ship sheets from JSON files.')
     parser.add_argument('-s', '--ship', help='Generate a specific ship by providing its JSON file path (e.g., ships/my_ship.json)')
+    parser.add_argument('-j', '--jobs', type=int, default=1, metavar='N', help='Render sheets in N worker processes (default: 1)')
+    parser.add_argument('--tile-jobs', type=int, default=1, metavar='N', help='Draw the system tiles of each sheet in N worker processes, for ships with many systems (default: 1)')
+    parser.add_argument('--format', choices=list(FORMATS) + ['pdf'], default='jpg', help='Output format of the sheets (default: jpg), pdf writes vector sheets')
+    parser.add_argument('--quality', type=int, metavar='Q', help='JPEG or WebP quality, 1-100 (default: Pillow default)')
+    parser.add_argument('--progressive', action='store_true', help='Write progressive JPEGs')
+    parser.add_argument('--optimize', action='store_true', help='Optimize the JPEG Huffman tables or the PNG encoding (slower, smaller files)')
+    parser.add_argument('--subsampling', choices=JPEG_SUBSAMPLING, help='JPEG chroma subsampling (default: 4:2:0)')
+    parser.add_argument('--compress-level', type=int, choices=range(10), metavar='0-9', help='PNG compression level (default: 6)')
+    parser.add_argument('--lossless', action='store_true', help='Write lossless WebP')
+    parser.add_argument('--pyramid', metavar='DPI[,DPI...]', help='Also save each raster sheet at these smaller DPIs (e.g., 150,50), downsampled from the --dpi render as <name>_<dpi>dpi.<format>')
+    parser.add_argument('--color-mode', choices=COLOR_MODES, default='RGB', help='Draw the sheets in color (RGB, default), grayscale (L) or pure black and white (1), grayscale ones use a third of the memory and give smaller files')
+    parser.add_argument('--dpi', type=int, default=DPI, help=f'Resolution of the sheets (default: {DPI}, at least {MIN_DPI}), lower values give quick drafts')
+    parser.add_argument('--force', action='store_true', help='Rebuild every sheet, even if its JSON and assets have not changed')
+    parser.add_argument('--tile-cache', metavar='DIR', help='Reuse rendered system tiles from an on-disk cache in DIR (e.g., .tile_cache)')
+    parser.add_argument('--tile-cache-size', type=int, default=256, metavar='MB', help='Maximum size of the tile cache in MB (default: 256)')
+    parser.add_argument('--impose', metavar='FILE', help='Print the sheets several to a page into a multi-page FILE (.pdf or .tif) instead of one image per ship')
+    parser.add_argument('--page', choices=['A4', 'A3', 'Letter'], default='A4', help='Page size used by --impose (default: A4)')
+    parser.add_argument('--per-page', type=int, default=2, metavar='N', help='Number of sheets per page with --impose (default: 2)')
+    parser.add_argument('--impose-tiles', action='store_true', help='With --impose, print the individual system tiles instead of the sheets')
+    parser.add_argument('--bundle', metavar='FILE', help='Render every ship of a JSON Lines file (or a JSON array of ships) into ships/<bundle name>/')
+    parser.add_argument('--template', metavar='FILE', help='Render every variant of a ship template (see templates.py) into ships/variants/<template>/')
+    parser.add_argument('--limit', type=int, metavar='N', help='With --template, only render the first N variants')
+    parser.add_argument('--memory-tiles', type=int, default=256, metavar='N', help='With --template or --bundle, keep up to N rendered tiles in memory per process so identical systems are drawn once (default: 256)')
+    parser.add_argument('--archive', metavar='FILE', help='Write the sheets of a batch, --bundle or --template run into FILE (.zip, .tar or .tar.gz) with a manifest.json, instead of one file per ship')
+    parser.add_argument('--atlas', metavar='DIR', help='Export the system tiles of the given ship (or every ship) as cards packed into PNG atlas pages in DIR, with an atlas.json index')
+    parser.add_argument('--atlas-size', type=int, metavar='PX', help='Width and height of the atlas pages (default: 4096)')
+    parser.add_argument('--watch', action='store_true', help='Keep running and re-render the given ship (or every ship) whenever its JSON changes, redrawing only the changed parts')
+    parser.add_argument('--check', action='store_true', help='Only report the sheets whose columns or shields overflow, without rendering anything')
+    parser.add_argument('--trace', metavar='FILE', help='Record the time spent in each rendering stage to FILE, a Chrome trace (open in ui.perfetto.dev)')
+    parser.add_argument('--gutter', type=float, default=10, metavar='MM', help='Space between imposed items in mm, holding their crop marks (default: 10)')
     args = parser.parse_args()
 
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.dpi < MIN_DPI:
+        parser.error(f"--dpi must be at least {MIN_DPI}")
+    if args.quality is not None and not 1 <= args.quality <= 100:
+        parser.error("--quality must be between 1 and 100")
+    if args.per_page < 1:
+        parser.error("--per-page must be at least 1")
+    if args.impose and os.path.splitext(args.impose)[1].lower() not in ('.pdf', '.tif', '.tiff'):
+        parser.error("--impose must be a .pdf or .tif file")
+    if args.archive and not args.archive.lower().endswith(('.zip', '.tar', '.tar.gz', '.tgz')):
+        parser.error("--archive must be a .zip, .tar or .tar.gz file")
+    if args.archive and (args.impose or args.check):
+        parser.error("--archive cannot be combined with --impose or --check")
+    if args.watch and (args.archive or args.impose or args.check or args.bundle or args.template):
+        parser.error("--watch cannot be combined with --archive, --impose, --check, --bundle or --template")
+    pyramid = ()
+    if args.pyramid:
+        try:
+            pyramid = tuple(sorted({int(level) for level in args.pyramid.split(",")}, reverse=True))
+        except ValueError:
+            parser.error("--pyramid must be a comma separated list of DPIs")
+        if args.format not in FORMATS:
+            parser.error("--pyramid only applies to raster formats (jpg, png or webp)")
+        if not all(1 <= level < args.dpi for level in pyramid):
+            parser.error("--pyramid DPIs must be at least 1 and below --dpi")
+    if args.atlas and (args.archive or args.impose or args.check or args.bundle or args.template or args.watch):
+        parser.error("--atlas cannot be combined with --archive, --impose, --check, --bundle, --template or --watch")
+    if args.atlas_size is not None and args.atlas_size < 64:
+        parser.error("--atlas-size must be at least 64")
+    if args.watch and args.format not in FORMATS:
+        parser.error("--watch only renders raster formats (jpg, png or webp)")
+    if args.tile_jobs < 1:
+        parser.error("--tile-jobs must be at least 1")
+    if args.tile_jobs > 1 and (args.jobs > 1 or args.watch or args.impose or args.atlas or args.check):
+        parser.error("--tile-jobs cannot be combined with --jobs, --watch, --impose, --atlas or --check")
+    if args.tile_jobs > 1 and args.format not in FORMATS:
+        parser.error("--tile-jobs only applies to raster formats (jpg, png or webp)")
+    if args.color_mode != 'RGB' and args.format not in FORMATS:
+        parser.error("--color-mode only applies to raster formats (jpg, png or webp)")
+    if args.color_mode == '1' and (args.impose or args.atlas):
+        parser.error("--color-mode 1 cannot be combined with --impose or --atlas, use L for grayscale")
+
+    encoder = None
+    if args.format in FORMATS:
+        encoder = encoder_options(args.format, quality=args.quality, progressive=args.progressive, optimize=args.optimize,
+                                  subsampling=args.subsampling, compress_level=args.compress_level, lossless=args.lossless)
+
+    tile_cache = None
+    if args.tile_cache:
+        tile_cache = TileCache(args.tile_cache, max_bytes=args.tile_cache_size * 1024 * 1024)
+
     # Create ships directory if it doesn't exist
     ships_dir = "ships"
     if not os.path.exists(ships_dir):
         os.makedirs(ships_dir)
     
-    if args.ship:
-        # Handle single ship generation
-        json_path = args.ship
-        if not os.path.exists(json_path):
-            print(f"Error: Ship file not found: {json_path}")
-            return
+    if args.trace:
+        tracing.enable()
+
+    archive = None
+    if args.archive:
+        # Only import the archive writer when archiving
+        from archive import ArchiveWriter
+        archive = ArchiveWriter(args.archive)
+
+    tile_pool = None
+    if args.tile_jobs > 1:
+        # Only start the tile workers (and load shared memory support) for parallel sheets
+        from tile_pool import TilePool
+        memory_tiles = args.memory_tiles if args.bundle or args.template else 0
+        tile_pool = TilePool(args.tile_jobs, args.dpi, canvas_mode(args.color_mode), tile_cache, memory_tiles)
+
+    try:
+        with span("main", ship=args.ship, jobs=args.jobs, format=args.format):
+            if args.bundle:
+                # Fleet export: stream the records of one file through the batch renderer
+                if not os.path.exists(args.bundle):
+                    print(f"Error: Bundle file not found: {args.bundle}")
+                    return
+                name = os.path.splitext(os.path.basename(args.bundle))[0]
+                output_dir = os.path.join(ships_dir, name)
+                if archive is None:
+                    os.makedirs(output_dir, exist_ok=True)
+                render_batch(bundle_ships(args.bundle), output_dir, jobs=args.jobs, tile_cache=tile_cache, dpi=args.dpi,
+                             output_format=args.format, encoder=encoder, memory_tiles=args.memory_tiles, archive=archive,
+                             pyramid=pyramid, color_mode=args.color_mode, tile_pool=tile_pool)
+            elif args.template:
+                # Parameter sweep: stream the variants of a template through the batch renderer
+                from templates import load_template, variant_count
+                name = os.path.splitext(os.path.basename(args.template))[0]
+                output_dir = os.path.join(ships_dir, "variants", name)
+                try:
+                    count = variant_count(load_template(args.template))
+                except ValueError as e:
+                    parser.error(f"--template: {e}")
+                print(f"Rendering {min(count, args.limit) if args.limit is not None else count} of {count} variants of {args.template}")
+                variants = template_variants(args.template, output_dir, args.format, limit=args.limit)
+                render_batch(variants, output_dir, jobs=args.jobs, tile_cache=tile_cache, dpi=args.dpi,
+                             output_format=args.format, encoder=encoder, memory_tiles=args.memory_tiles, archive=archive,
+                             pyramid=pyramid, color_mode=args.color_mode, tile_pool=tile_pool)
+            elif args.watch:
+                # Live preview: re-render the given ship or every ship as its JSON is saved
+                from watch import watch_ships
+                if args.ship:
+                    json_paths = lambda: [args.ship] if os.path.exists(args.ship) else []
+                else:
+                    json_paths = lambda: ship_json_paths(ships_dir)
+                watch_ships(json_paths, ships_dir, dpi=args.dpi, output_format=args.format, encoder=encoder, tile_cache=tile_cache,
+                            pyramid=pyramid, color_mode=args.color_mode)
+            elif args.check:
+                # Preflight: lay out the given ship or every ship and report overflows
+                if args.ship:
+                    json_paths = [args.ship]
+                else:
+                    json_paths = ship_json_paths(ships_dir)
+                if check_ships(json_paths, dpi=args.dpi):
+                    sys.exit(1)
+            elif args.atlas:
+                # Card export: the tiles of the given ship or every ship, packed into texture atlases
+                if args.ship:
+                    json_paths = [args.ship]
+                else:
+                    json_paths = ship_json_paths(ships_dir)
+                export_atlas(json_paths, args.atlas, page_size=args.atlas_size, tile_cache=tile_cache, dpi=args.dpi,
+                             mode=args.color_mode)
+            elif args.impose:
+                # Print run: the given ship or every ship, imposed on physical pages
+                if args.ship:
+                    json_paths = [args.ship]
+                else:
+                    json_paths = ship_json_paths(ships_dir)
+                impose_ships(json_paths, args.impose, page=args.page, per_page=args.per_page, tiles=args.impose_tiles,
+                             gutter_mm=args.gutter, tile_cache=tile_cache, dpi=args.dpi, mode=args.color_mode)
+            elif args.ship and archive is None:
+                # Handle single ship generation
+                json_path = args.ship
+                if not os.path.exists(json_path):
+                    print(f"Error: Ship file not found: {json_path}")
+                    return
         
-        try:
-            # Load ship data
-            with open(json_path, "r") as f:
-                ship_data = json.load(f)
+                try:
+                    # Load ship data
+                    with open(json_path, "r") as f:
+                        ship_data = json.load(f)
             
-            # Create the ship sheet with ship name in filename
-            ship_name = ship_data["title"].lower().replace(" ", "_")
-            output_path = os.path.join(ships_dir, f"{ship_name}.jpg")
-            create_ship_sheet(ship_data, output_path)
+                    # Create the ship sheet with ship name in filename
+                    output_path = ship_output_path(ship_data, ships_dir, args.format)
+                    create_ship_sheet(ship_data, output_path, tile_cache=tile_cache, dpi=args.dpi, encoder=encoder, pyramid=pyramid,
+                                      color_mode=args.color_mode, tile_pool=tile_pool)
             
-        except Exception as e:
-            print(f"Error processing {json_path}: {str(e)}")
-    else:
-        # Find all JSON files in the ships directory
-        json_files = [f for f in os.listdir(ships_dir) if f.endswith('.json')]
+                except Exception as e:
+                    print(f"Error processing {json_path}: {str(e)}")
+            elif archive is not None:
+                # Archive export: the given ship or every ship, streamed into one file. Every sheet is
+                # rendered, since an incremental build would leave the unchanged ones out of the archive
+                if args.ship:
+                    json_paths = [args.ship]
+                else:
+                    json_paths = ship_json_paths(ships_dir)
+                render_batch(json_paths, ships_dir, jobs=args.jobs, tile_cache=tile_cache, dpi=args.dpi, output_format=args.format,
+                             encoder=encoder, archive=archive, pyramid=pyramid, color_mode=args.color_mode, tile_pool=tile_pool)
+            else:
+                # Find all JSON files in the ships directory
+                json_paths = ship_json_paths(ships_dir)
         
-        if not json_files:
-            print("No JSON files found in the ships directory")
-            return
+                if not json_paths:
+                    print("No JSON files found in the ships directory")
+                    return
         
-        # Process each JSON file
-        for json_file in json_files:
-            json_path = os.path.join(ships_dir, json_file)
-            try:
-                # Load ship data
-                with open(json_path, "r") as f:
-                    ship_data = json.load(f)
-                
-                # Create the ship sheet with ship name in filename
-                ship_name = ship_data["title"].lower().replace(" ", "_")
-                output_path = os.path.join(ships_dir, f"{ship_name}.jpg")
-                create_ship_sheet(ship_data, output_path)
-                
-            except Exception as e:
-                print(f"Error processing {json_file}: {str(e)}")
+                # Skip unchanged ships and delete the sheets of ships whose JSON is gone
+                manifest = BuildManifest(os.path.join(ships_dir, MANIFEST_NAME), asset_fingerprint(), RENDERER_VERSION,
+                                         settings={"dpi": args.dpi, "format": args.format, "encoder": encoder, "pyramid": list(pyramid),
+                                                   "color_mode": args.color_mode})
+                for output_path in manifest.prune([os.path.basename(json_path) for json_path in json_paths]):
+                    print(f"Removed stale ship sheet: {output_path}")
+        
+                render_batch(json_paths, ships_dir, jobs=args.jobs, tile_cache=tile_cache, manifest=manifest, dpi=args.dpi, output_format=args.format,
+                             encoder=encoder, pyramid=pyramid, color_mode=args.color_mode, tile_pool=tile_pool, force=args.force)
+    finally:
+        if tile_pool is not None:
+            tile_pool.close()
+        if archive is not None:
+            archive.close()
+            print(f"Saved {archive.count} ship sheets to: {args.archive}")
+        if args.trace:
+            tracing.write(args.trace)
+            print(f"Saved trace to: {args.trace}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
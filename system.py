@@ -1,28 +1,77 @@
-import json
 from PIL import Image, ImageDraw, ImageFont
 import os
-import math
-from svglib.svglib import svg2rlg
-from reportlab.graphics import renderPM
-import io
-import tempfile
+import functools
+from assets import get_font, get_icon, get_icon_by_height, icon_size_by_height
+from layout import Box, text_box, image_box, rasterize, icon_mode
+from tracing import span
 
 # Constants for the new tile format
 TILE_WIDTH_CM = 8  # 8cm width
 TILE_HEIGHT_CM = 4  # 4cm height (2:1 ratio)
 DPI = 300
 
+# Pixel sizes in the layout code are given for a tile rendered at 8cm@300 DPI,
+# and are scaled proportionally when rendering at any other size
+BASE_TILE_WIDTH_PX = int(round(TILE_WIDTH_CM * DPI / 2.54))
+
+# Bump whenever a change to the tile renderer alters the tiles, so cached tiles are drawn again
+TILE_RENDERER_VERSION = 1
+
+# Narrowest tile that can be drawn: every font is then at least 1px, the smallest one (the
+# Med Bay label) being 3% of the tile width
+MIN_TILE_WIDTH_PX = 50
+
+# Maximum number of memoized text measurements
+TEXT_SIZE_CACHE_SIZE = 4096
+
 # Font paths
 FONTS_DIR = "fonts"
 EUROSTILE_BOLD = os.path.join(FONTS_DIR, "Eurostile Extended Bold.ttf")
 TITILLIUM_SEMIBOLD = os.path.join(FONTS_DIR, "TitilliumWeb-SemiBold.ttf")
 TITILLIUM_REGULAR = os.path.join(FONTS_DIR, "TitilliumWeb-Regular.ttf")
 
-def get_text_size(draw, text, font):
-    """Calculate the size of text with the given font."""
-    bbox = draw.textbbox((0, 0), text, font=font)
+# Resource paths
+RESOURCES_DIR = "resources"
+ARROW_SYMBOL = os.path.join(RESOURCES_DIR, "arrow_symbol.png")
+ARROW_LONG_SYMBOL = os.path.join(RESOURCES_DIR, "arrow_long_symbol.png")
+ARROW_EMPTY_SYMBOL = os.path.join(RESOURCES_DIR, "arrow_empty_symbol.png")
+ENERGY_SYMBOL = os.path.join(RESOURCES_DIR, "energy_symbol.png")
+ENERGY_SYMBOL_LARGE = os.path.join(RESOURCES_DIR, "energy_symbol_large.png")
+CREW_SYMBOL = os.path.join(RESOURCES_DIR, "crew_symbol.png")
+MED_BAY_SYMBOL = os.path.join(RESOURCES_DIR, "med_bay_symbol.png")
+HULL_ICON = os.path.join(RESOURCES_DIR, "hull_icon.png")
+ELECTRIC_ICON = os.path.join(RESOURCES_DIR, "electric_icon.png")
+LIFE_SUPPORT_ICON = os.path.join(RESOURCES_DIR, "life_support_icon.png")
+
+def scaled(value, scale):
+    """Scale a pixel size given for the base tile width."""
+    return int(round(value * scale))
+
+@functools.lru_cache(maxsize=TEXT_SIZE_CACHE_SIZE)
+def _measure_text(font, text, fontmode):
+    """Return the bounding box size of a single line of text, memoized by font identity and text."""
+    bbox = font.getbbox(text, fontmode)
     return bbox[2] - bbox[0], bbox[3] - bbox[1]
 
+@functools.lru_cache(maxsize=TEXT_SIZE_CACHE_SIZE)
+def _measure_word(font, word, fontmode):
+    """Return the advance width and the left and right ink edges of a word, memoized apart from whole strings."""
+    bbox = font.getbbox(word, fontmode)
+    return font.getlength(word, fontmode), bbox[0], bbox[2]
+
+def get_text_size(draw, text, font):
+    """Calculate the size of text with the given font.
+
+    draw may be None to measure text for a regular (anti-aliased) canvas without drawing anything.
+    """
+    if "\n" in text:
+        if draw is None:
+            draw = ImageDraw.Draw(Image.new("L", (1, 1)))
+        bbox = draw.textbbox((0, 0), text, font=font)
+        return bbox[2] - bbox[0], bbox[3] - bbox[1]
+    # Same measurement as draw.textbbox, which only depends on the font mode of the draw
+    return _measure_text(font, text, draw.fontmode if draw is not None else "L")
+
 def create_weapon_symbol_svg(x, y, width, height):
     """Create an SVG string for the weapon symbol."""
     # Calculate the points for the shape
@@ -50,9 +99,8 @@ def create_weapon_symbol_svg(x, y, width, height):
     
     return svg
 
-def draw_weapon_symbol(draw, x, y, size, damage, range_val, font):
-    """Draw a weapon symbol with damage and range values."""
-    # Load and resize the symbol image
+def layout_weapon_symbol(damage, range_val, font, scale=1.0):
+    """Lay out a weapon symbol with damage and range values as a sprite box."""
     if not isinstance(range_val, str) and range_val == "0-0":
         #error here
         print(f"Error: Range value is not a string and is not '0-0' for {damage} damage")
@@ -60,100 +108,123 @@ def draw_weapon_symbol(draw, x, y, size, damage, range_val, font):
     is_long_arrow = False
     if isinstance(range_val, str) and len(range_val) > 2:  # If range is a string and longer than 2 chars
         is_long_arrow = True
-        symbol_img = Image.open("resources/arrow_long_symbol.png")
+        symbol_path = ARROW_LONG_SYMBOL
     else:
-        symbol_img = Image.open("resources/arrow_symbol.png")
+        symbol_path = ARROW_SYMBOL
 
-    # Resize to 60px height while maintaining aspect ratio
-    aspect_ratio = symbol_img.width / symbol_img.height
-    target_height = 60
-    target_width = int(target_height * aspect_ratio)
-    symbol_img = symbol_img.resize((target_width, target_height), Image.Resampling.LANCZOS)
+    # Resized to 60px height while maintaining aspect ratio
+    target_height = scaled(60, scale)
+    symbol_size = icon_size_by_height(symbol_path, target_height)
 
-    # Create a new image with alpha channel for anti-aliasing
-    final_img = Image.new('RGBA', symbol_img.size, (255, 255, 255, 0))
-    final_draw = ImageDraw.Draw(final_img)
-    
-    # Paste the symbol
-    final_img.paste(symbol_img, (0, 0), symbol_img)
+    # The badge is composed on its own layer with alpha channel for anti-aliasing
+    badge = Box("badge", 0, 0, symbol_size[0], symbol_size[1], sprite=True, name="weapon",
+                key=("weapon", str(damage), str(range_val), font_key(font), scale))
+    badge.add(image_box(0, 0, symbol_path, symbol_size))
     
     # Draw the numbers in large Eurostile font
     # Left number (damage)
-    damage_w, damage_h = get_text_size(final_draw, str(damage), font)
-    damage_x = 28 - (damage_w) // 2
-    damage_y = (target_height - damage_h) // 2 - 4
-    final_draw.text((damage_x, damage_y), str(damage), font=font, fill="black")
+    damage_size = get_text_size(None, str(damage), font)
+    damage_x = scaled(28, scale) - (damage_size[0]) // 2
+    damage_y = (target_height - damage_size[1]) // 2 - scaled(4, scale)
+    badge.add(text_box(damage_x, damage_y, str(damage), font, damage_size))
     
     # Right number (range)
-    range_w, range_h = get_text_size(final_draw, str(range_val), font)
-    range_x = 103 - (range_w) // 2 if is_long_arrow else 79 - (range_w) // 2
-    range_y = (target_height - range_h) // 2 - 4
-    final_draw.text((range_x, range_y), str(range_val), font=font, fill="black")
+    range_size = get_text_size(None, str(range_val), font)
+    range_x = scaled(103, scale) - (range_size[0]) // 2 if is_long_arrow else scaled(79, scale) - (range_size[0]) // 2
+    range_y = (target_height - range_size[1]) // 2 - scaled(4, scale)
+    badge.add(text_box(range_x, range_y, str(range_val), font, range_size))
     
-    return final_img
+    return badge
 
-def draw_engine_symbol(draw, x, y, size, speed, font, steer_text=None):
-    """Draw an engine symbol with speed value and steer text."""
-    # Load and resize the symbol image
-    symbol_img = Image.open("resources/arrow_empty_symbol.png")
-    
-    # Resize to 60px height while maintaining aspect ratio
-    aspect_ratio = symbol_img.width / symbol_img.height
-    target_height = 60
-    target_width = int(target_height * aspect_ratio)
-    symbol_img = symbol_img.resize((target_width, target_height), Image.Resampling.LANCZOS)
+def layout_engine_symbol(speed, font, steer_text=None, scale=1.0):
+    """Lay out an engine symbol with speed value and steer text as a sprite box."""
+    # Symbol resized to 60px height while maintaining aspect ratio
+    target_height = scaled(60, scale)
+    symbol_size = icon_size_by_height(ARROW_EMPTY_SYMBOL, target_height)
+    target_width = symbol_size[0]
     
     # Calculate additional width needed for steer text if present
     extra_width = 0
     if steer_text:
         steer_text = steer_text.replace("Â°", "°")
-        steer_w, steer_h = get_text_size(draw, steer_text, font)
-        extra_width = steer_w + 20  # Add 20px padding
-    
-    # Create a new image with alpha channel for anti-aliasing
-    final_img = Image.new('RGBA', (target_width + extra_width, target_height), (255, 255, 255, 0))
-    final_draw = ImageDraw.Draw(final_img)
+        steer_size = get_text_size(None, steer_text, font)
+        extra_width = steer_size[0] + scaled(20, scale)  # Add 20px padding
     
-    # Paste the symbol
-    final_img.paste(symbol_img, (0, 0), symbol_img)
+    # The badge is composed on its own layer with alpha channel for anti-aliasing
+    badge = Box("badge", 0, 0, target_width + extra_width, target_height, sprite=True, name="engine",
+                key=("engine", str(speed), steer_text, font_key(font), scale))
+    badge.add(image_box(0, 0, ARROW_EMPTY_SYMBOL, symbol_size))
     
     # Draw the speed value in large Eurostile font
-    speed_w, speed_h = get_text_size(final_draw, str(speed), font)
-    speed_x = 52 - (speed_w) // 2
-    speed_y = (target_height - speed_h) // 2 - 4
-    final_draw.text((speed_x, speed_y), str(speed), font=font, fill="black")
+    speed_size = get_text_size(None, str(speed), font)
+    speed_x = scaled(52, scale) - (speed_size[0]) // 2
+    speed_y = (target_height - speed_size[1]) // 2 - scaled(4, scale)
+    badge.add(text_box(speed_x, speed_y, str(speed), font, speed_size))
     
     # Draw steer text if present
     if steer_text:
-        steer_w, steer_h = get_text_size(final_draw, steer_text, font)
-        steer_x = target_width + 10  # 10px padding after the symbol
-        steer_y = (target_height - steer_h) // 2
-        final_draw.text((steer_x, steer_y), steer_text, font=font, fill="black")
+        steer_x = target_width + scaled(10, scale)  # 10px padding after the symbol
+        steer_y = (target_height - steer_size[1]) // 2
+        badge.add(text_box(steer_x, steer_y, steer_text, font, steer_size))
     
-    return final_img
+    return badge
 
 def wrap_text(text, font, max_width, draw):
-    """Wrap text to fit within max_width."""
-    words = text.split()
+    """Wrap text so the bounding box of each line fits within max_width.
+
+    Line widths are added up from the memoized advance and ink edges of each word and of the
+    space, and each emitted line gets a single bounding box check, so wrapping is linear in the
+    text length.
+    """
+    fontmode = draw.fontmode if draw is not None else "L"
+    space_width = _measure_word(font, " ", fontmode)[0]
     lines = []
     current_line = []
-    
-    for word in words:
-        test_line = ' '.join(current_line + [word])
-        width, _ = get_text_size(draw, test_line, font)
-        
-        if width <= max_width:
-            current_line.append(word)
-        else:
+    line_left = line_advance = 0
+    
+    def emit():
+        # Kerning across spaces can make the line a little wider than its words added up
+        bbox = font.getbbox(' '.join(current_line), fontmode)
+        if bbox[2] - bbox[0] > max_width and len(current_line) > 1:
+            lines.append(' '.join(current_line[:-1]))
+            return current_line[-1:]
+        lines.append(' '.join(current_line))
+        return []
+    
+    for word in text.split():
+        word_width, word_left, word_right = _measure_word(font, word, fontmode)
+        while current_line:
+            word_x = line_advance + space_width
+            if word_x + word_right - line_left <= max_width:
+                current_line.append(word)
+                line_advance = word_x + word_width
+                break
+            current_line = emit()
             if current_line:
-                lines.append(' '.join(current_line))
+                line_width, line_left, _ = _measure_word(font, current_line[0], fontmode)
+                line_advance = line_width
+        else:
             current_line = [word]
+            line_left, line_advance = word_left, word_width
     
     if current_line:
-        lines.append(' '.join(current_line))
+        current_line = emit()
+        if current_line:
+            lines.append(current_line[0])
     
     return lines
 
+def font_key(font):
+    """Return a hashable identifier of a font for sprite keys.
+
+    Fonts from get_font are identified by their file and size. The load_default() fallback has no
+    file path (or a new in-memory one each time), so all fallbacks of the same size share a key.
+    """
+    path = getattr(font, "path", None)
+    if isinstance(path, str):
+        return (path, font.size)
+    return ("default", getattr(font, "size", None))
+
 def load_fonts(dpi, tile_width_px):
     """Load the required fonts with appropriate sizes."""
     # Font sizes as percentages of tile width
@@ -164,171 +235,147 @@ def load_fonts(dpi, tile_width_px):
     combat_number_font_size = int(tile_width_px * 0.05)  # 4.5% of width
     
     try:
-        title_font = ImageFont.truetype(EUROSTILE_BOLD, title_font_size)
+        title_font = get_font(EUROSTILE_BOLD, title_font_size)
     except IOError:
         print(f"Warning: Could not load {EUROSTILE_BOLD}, falling back to default font")
         title_font = ImageFont.load_default()
     
     try:
-        subtitle_font = ImageFont.truetype(TITILLIUM_SEMIBOLD, subtitle_font_size)
+        subtitle_font = get_font(TITILLIUM_SEMIBOLD, subtitle_font_size)
     except IOError:
         print(f"Warning: Could not load {TITILLIUM_SEMIBOLD}, falling back to default font")
         subtitle_font = ImageFont.load_default()
     
     try:
-        area_title_font = ImageFont.truetype(EUROSTILE_BOLD, area_title_font_size)
+        area_title_font = get_font(EUROSTILE_BOLD, area_title_font_size)
     except IOError:
         print(f"Warning: Could not load {EUROSTILE_BOLD}, falling back to default font")
         area_title_font = ImageFont.load_default()
     
     try:
-        description_font = ImageFont.truetype(TITILLIUM_SEMIBOLD, description_font_size)
+        description_font = get_font(TITILLIUM_SEMIBOLD, description_font_size)
     except IOError:
         print(f"Warning: Could not load {TITILLIUM_REGULAR}, falling back to default font")
         description_font = ImageFont.load_default()
     
     try:
-        combat_number_font = ImageFont.truetype(EUROSTILE_BOLD, combat_number_font_size)
+        combat_number_font = get_font(EUROSTILE_BOLD, combat_number_font_size)
     except IOError:
         print(f"Warning: Could not load {EUROSTILE_BOLD}, falling back to default font")
         combat_number_font = ImageFont.load_default()
     
     return title_font, subtitle_font, area_title_font, description_font, combat_number_font
 
-def load_resource_symbols():
-    """Load all resource symbols used in systems."""
-    energy_img = Image.open("resources/energy_symbol.png")
-    energy_large_img = Image.open("resources/energy_symbol_large.png")
-    crew_img = Image.open("resources/crew_symbol.png")
-    med_bay_img = Image.open("resources/med_bay_symbol.png")
-    hull_img = Image.open("resources/hull_icon.png")
-    electric_img = Image.open("resources/electric_icon.png")
-    life_support_img = Image.open("resources/life_support_icon.png")
-    
-    # Resize all symbols to 60x60
-    icon_size = 60
-    large_icon_size = 120
-    energy_img = energy_img.resize((icon_size, icon_size), Image.Resampling.LANCZOS)
-    energy_large_img = energy_large_img.resize((large_icon_size, large_icon_size), Image.Resampling.LANCZOS)
-    crew_img = crew_img.resize((icon_size, icon_size), Image.Resampling.LANCZOS)
-    med_bay_img = med_bay_img.resize((large_icon_size, large_icon_size), Image.Resampling.LANCZOS)
-    hull_img = hull_img.resize((icon_size, icon_size), Image.Resampling.LANCZOS)
-    electric_img = electric_img.resize((icon_size, icon_size), Image.Resampling.LANCZOS)
-    life_support_img = life_support_img.resize((icon_size, icon_size), Image.Resampling.LANCZOS)
+def load_resource_symbols(scale=1.0, mode=None):
+    """Load all resource symbols used in systems, converted to mode if given."""
+    # All symbols are 60x60, except the large energy and med bay ones
+    icon_size = scaled(60, scale)
+    large_icon_size = scaled(120, scale)
+    energy_img = get_icon(ENERGY_SYMBOL, icon_size, mode=mode)
+    energy_large_img = get_icon(ENERGY_SYMBOL_LARGE, large_icon_size, mode=mode)
+    crew_img = get_icon(CREW_SYMBOL, icon_size, mode=mode)
+    med_bay_img = get_icon(MED_BAY_SYMBOL, large_icon_size, mode=mode)
+    hull_img = get_icon(HULL_ICON, icon_size, mode=mode)
+    electric_img = get_icon(ELECTRIC_ICON, icon_size, mode=mode)
+    life_support_img = get_icon(LIFE_SUPPORT_ICON, icon_size, mode=mode)
     
     return energy_img, energy_large_img, crew_img, med_bay_img, hull_img, electric_img, life_support_img
 
-def generate_title(draw, system, title_font, effective_width, vertical_margin):
-    """Generate the title for a system."""
+def layout_title(system, title_font, effective_width, vertical_margin):
+    """Lay out the title of a system."""
     title_text = system["name"].upper()
-    title_w, title_h = get_text_size(draw, title_text, title_font)
-    title_x = (effective_width - title_w) // 2
+    title_size = get_text_size(None, title_text, title_font)
+    title_x = (effective_width - title_size[0]) // 2
     title_y = vertical_margin
-    draw.text((title_x, title_y), title_text, font=title_font, fill="black")
-    return title_h
+    title = Box("title", title_x, title_y, title_size[0], title_size[1])
+    title.add(text_box(0, 0, title_text, title_font, title_size))
+    return title
 
-def generate_rules(draw, system, subtitle_font, effective_width, current_y, vertical_spacing):
-    """Generate the rules text for a system."""
+def layout_rules(system, subtitle_font, effective_width, current_y, vertical_spacing):
+    """Lay out the rules text of a system, returning its box (or None) and the height it takes."""
     if "rules" in system and system["rules"]:
         rules_text = system["rules"].replace("Â°", "°")
-        rules_w, rules_h = get_text_size(draw, rules_text, subtitle_font)
-        rules_x = (effective_width - rules_w) // 2
+        rules_size = get_text_size(None, rules_text, subtitle_font)
+        rules_x = (effective_width - rules_size[0]) // 2
         rules_y = current_y
-        draw.text((rules_x, rules_y), rules_text, font=subtitle_font, fill="black")
-        return max(rules_h + vertical_spacing, 5 * vertical_spacing)
-    return 0
+        rules = Box("rules", rules_x, rules_y, rules_size[0], rules_size[1])
+        rules.add(text_box(0, 0, rules_text, subtitle_font, rules_size))
+        return rules, max(rules_size[1] + vertical_spacing, 5 * vertical_spacing)
+    return None, 0
 
-def generate_action(draw, area, content_x, area_title_font, description_font, vertical_spacing):
-    """Generate a single action (area) with its content."""
+def layout_action(area, content_x, area_title_font, description_font, vertical_spacing, scale=1.0):
+    """Lay out a single action (area) with its content, relative to the top of the content."""
     content_height = 0
     elements = []
     
-    # Draw weapon symbol if it exists
+    # Weapon or engine symbol if it exists
     weapon_width = 0
+    weapon = None
     if "shoot" in area:
-        weapon_img = draw_weapon_symbol(draw, content_x, 0, 150,
-                          area["shoot"]["damage"],
-                          area["shoot"]["range"],
-                          area_title_font)
-        weapon_width = weapon_img.width
-        elements.append(("image", (content_x, 0), weapon_img))
-        content_height = max(content_height, weapon_img.height)
+        weapon = layout_weapon_symbol(area["shoot"]["damage"],
+                                      area["shoot"]["range"],
+                                      area_title_font,
+                                      scale=scale)
     elif "engine" in area:
-        engine_img = draw_engine_symbol(draw, content_x, 0, 150,
-                          area["engine"]["speed"],
-                          area_title_font,
-                          area["engine"]["steer"])
-        weapon_width = engine_img.width
-        elements.append(("image", (content_x, 0), engine_img))
-        content_height = max(content_height, engine_img.height)
-    
-    # Draw description
+        weapon = layout_engine_symbol(area["engine"]["speed"],
+                                      area_title_font,
+                                      area["engine"]["steer"],
+                                      scale=scale)
+    if weapon:
+        weapon.x = content_x
+        weapon_width = weapon.width
+        elements.append(weapon)
+        content_height = max(content_height, weapon.height)
+    
+    # Description
     if area["description"]:
         desc_text = area["description"].replace("Â°", "°")
-        desc_w, desc_h = get_text_size(draw, desc_text, description_font)
-        desc_x = content_x + (weapon_width + 20 if "shoot" in area or "engine" in area else 0)
+        desc_size = get_text_size(None, desc_text, description_font)
+        desc_x = content_x + (weapon_width + scaled(20, scale) if "shoot" in area or "engine" in area else 0)
         
         if "shoot" in area or "engine" in area:
             desc_y = 0
         else:
             baseline_offset = description_font.size // 4
-            desc_y = (60 - desc_h) // 2 - baseline_offset
+            desc_y = (scaled(60, scale) - desc_size[1]) // 2 - baseline_offset
         
-        elements.append(("text", (desc_x, desc_y), desc_text, description_font))
-        content_height = max(content_height, desc_h if "shoot" in area or "engine" in area else 60)
+        elements.append(text_box(desc_x, desc_y, desc_text, description_font, desc_size))
+        content_height = max(content_height, desc_size[1] if "shoot" in area or "engine" in area else scaled(60, scale))
     
     return content_height, elements
 
-def generate_cost_symbols(draw, energy_count, crew_count, energy_img, crew_img):
-    """Generate cost symbols for an action."""
-    symbols = []
-    for _ in range(energy_count):
-        symbols.append(("energy", energy_img))
-    for _ in range(crew_count):
-        symbols.append(("crew", crew_img))
+def layout_cost_symbols(energy_count, crew_count, scale=1.0):
+    """Lay out the cost symbols of an action as a sprite box, returning its height and the box (or None)."""
+    symbols = [ENERGY_SYMBOL] * energy_count + [CREW_SYMBOL] * crew_count
     
     if not symbols:
         return 0, None
     
     # Calculate dimensions
-    symbol_size = 60
-    gap = 10
-    
-    # Calculate total height needed for all symbols
-    total_height = 0
-    remaining_symbols = len(symbols)
-    while remaining_symbols > 0:
-        if remaining_symbols >= 2:
-            total_height += symbol_size + gap
-        else:
-            total_height += symbol_size
-        remaining_symbols -= 2
-    
-    # Create temporary image for symbols
-    symbols_img = Image.new('RGBA', (symbol_size * 2 + gap, total_height), (255, 255, 255, 0))
-    symbols_draw = ImageDraw.Draw(symbols_img)
-    
-    # Draw symbols in pairs
-    current_y = 0
-    remaining_symbols = len(symbols)
-    while remaining_symbols > 0:
-        if remaining_symbols >= 2:
-            # Draw a pair of symbols
-            symbols_img.paste(symbols[0][1], (0, current_y), symbols[0][1])
-            symbols_img.paste(symbols[1][1], (symbol_size + gap, current_y), symbols[1][1])
-            symbols = symbols[2:]  # Remove the pair we just drew
-            current_y += symbol_size + gap
-            remaining_symbols -= 2
+    symbol_size = scaled(60, scale)
+    gap = scaled(10, scale)
+    
+    # Symbols are drawn in pairs, with the last single symbol centered
+    rows = (len(symbols) + 1) // 2
+    total_height = rows * symbol_size + (len(symbols) // 2) * gap
+    
+    grid = Box("cost", 0, 0, symbol_size * 2 + gap, total_height, sprite=True, key=(energy_count, crew_count, scale))
+    for idx, symbol_path in enumerate(symbols):
+        current_y = (idx // 2) * (symbol_size + gap)
+        if idx % 2:
+            x = symbol_size + gap
+        elif idx == len(symbols) - 1:
+            x = (symbol_size * 2 + gap - symbol_size) // 2
         else:
-            # Center the last single symbol
-            symbols_img.paste(symbols[0][1], ((symbol_size * 2 + gap - symbol_size) // 2, current_y), symbols[0][1])
-            remaining_symbols -= 1
+            x = 0
+        grid.add(image_box(x, current_y, symbol_path, (symbol_size, symbol_size)))
     
-    return total_height, symbols_img
+    return total_height, grid
 
-def generate_mess_content(draw, system, title_font, subtitle_font, area_title_font, description_font, med_bay_img, tile_width_px, current_y, vertical_spacing):
-    """Generate content for the Mess system."""
-    mess_height = 200
+def layout_mess_content(system, area_title_font, tile_width_px, current_y, vertical_spacing, scale=1.0):
+    """Lay out the content of the Mess system, returning the new current_y and the boxes to draw."""
+    boxes = []
+    mess_height = scaled(200, scale)
     current_y += mess_height
 
     if "med_bay" in system and system["med_bay"] > 0:
@@ -336,144 +383,141 @@ def generate_mess_content(draw, system, title_font, subtitle_font, area_title_fo
         med_bay_width = int(tile_width_px * med_bay_ratio)
         main_section_width = tile_width_px - med_bay_width
         
-        # Draw vertical divider
-        divider_padding = 20
+        # Vertical divider
+        divider_padding = scaled(20, scale)
         divider_x = main_section_width
-        draw.line([(divider_x, divider_padding), 
-                  (divider_x, current_y - divider_padding)], 
-                 fill="black", width=2)
+        boxes.append(Box("line", points=[(divider_x, divider_padding),
+                                         (divider_x, current_y - divider_padding)],
+                         line_width=scaled(2, scale)))
         
-        # Draw med bay symbols
+        # Med bay symbols
         med_bay_count = system["med_bay"]
-        symbol_width = med_bay_img.width
-        gap = 10
+        symbol_width = scaled(120, scale)
+        gap = scaled(10, scale)
         
-        start_x = divider_x + (med_bay_width - symbol_width) // 2 - 50
+        start_x = divider_x + (med_bay_width - symbol_width) // 2 - scaled(50, scale)
         total_simbols_width = med_bay_count * (symbol_width) + gap * min(med_bay_count - 1, 0)
         start_y = current_y // 2 - total_simbols_width // 2
         
         for i in range(med_bay_count):
             pos_y = start_y + (i * (symbol_width + gap))
-            draw._image.paste(med_bay_img, (start_x, pos_y), med_bay_img)
+            boxes.append(image_box(start_x, pos_y, MED_BAY_SYMBOL, (symbol_width, symbol_width)))
         
-        # Draw "MED BAY" text vertically
+        # "MED BAY" text, drawn vertically
         med_bay_font_size = int(area_title_font.size * 0.75)
-        med_bay_font = ImageFont.truetype(EUROSTILE_BOLD, med_bay_font_size)
+        med_bay_font = get_font(EUROSTILE_BOLD, med_bay_font_size)
         med_bay_text = "MED BAY"
-        med_bay_w, med_bay_h = get_text_size(draw, med_bay_text, med_bay_font)
+        med_bay_w, med_bay_h = get_text_size(None, med_bay_text, med_bay_font)
         
-        # Create text image with extra padding
-        padding = 10
-        # Create a taller image to accommodate the rotated text
-        text_img = Image.new('RGBA', (med_bay_w + padding*2, med_bay_h + padding*2), (255, 255, 255, 0))
-        text_draw = ImageDraw.Draw(text_img)
-        text_draw.text((padding, padding), med_bay_text, font=med_bay_font, fill="black")
-        
-        # Rotate the text
-        text_img = text_img.rotate(-90, expand=True)
+        # Text layer with extra padding, rotated by 90 degrees so its width and height are swapped
+        padding = scaled(10, scale)
+        label_width = med_bay_h + padding*2
+        label_height = med_bay_w + padding*2
         
         # Position the text at the right edge of the med bay section
-        med_bay_x = divider_x + med_bay_width - text_img.width   # 10px padding from right edge
-        med_bay_y = current_y - mess_height - text_img.height // 2 + 24
-        draw._image.paste(text_img, (med_bay_x, med_bay_y), text_img)
-    
-    return current_y
+        med_bay_x = divider_x + med_bay_width - label_width   # 10px padding from right edge
+        med_bay_y = current_y - mess_height - label_height // 2 + scaled(24, scale)
+        label = Box("label", med_bay_x, med_bay_y, label_width, label_height, sprite=True, rotate=-90,
+                    key=(med_bay_text, font_key(med_bay_font), scale))
+        label.add(text_box(padding, padding, med_bay_text, med_bay_font, (med_bay_w, med_bay_h)))
+        boxes.append(label)
+    
+    return current_y, boxes
 
-def generate_reactor_content(draw, system, energy_large_img, current_y, vertical_spacing):
-    """Generate content for the Reactor system."""
-    empty_space_height = 150
+def layout_reactor_content(system, tile_width_px, current_y, vertical_spacing, scale=1.0):
+    """Lay out the content of the Reactor system, returning the new current_y and the boxes to draw."""
+    boxes = []
+    empty_space_height = scaled(150, scale)
     if "circles" in system:
         energy_count = system["circles"]
-        symbol_width = energy_large_img.width
-        gap = 20
+        large_icon_size = scaled(120, scale)
+        symbol_width = large_icon_size
+        gap = scaled(20, scale)
         
         total_width = (energy_count * symbol_width) + ((energy_count - 1) * gap)
 
         # If the total width is too large, reduce the symbol size by 10px and try again.
         for attempt in range(6):
-            if total_width <= (draw._image.width - 20):  # 40px padding
+            if total_width <= (tile_width_px - scaled(20, scale)):  # 40px padding
                 break
             # Reduce symbol size by 10px
-            symbol_width -= 10
-            gap -= 3
+            symbol_width -= scaled(10, scale)
+            gap -= scaled(3, scale)
             total_width = (energy_count * symbol_width) + ((energy_count - 1) * gap)
             print(f"Reactor energy symbols too large, reducing size to {symbol_width}px and gap to {gap} (attempt {attempt + 1}/6)")
 
-        # Create a copy to energy_large_img and rescale it to the new symbol_width
-        energy_large_img_copy = energy_large_img.copy()
-        energy_large_img_copy = energy_large_img_copy.resize((symbol_width, symbol_width), Image.Resampling.LANCZOS)    
-        
-        start_x = (draw._image.width - total_width) // 2
-        symbol_y = current_y + (empty_space_height - energy_large_img.height) // 2
+        start_x = (tile_width_px - total_width) // 2
+        symbol_y = current_y + (empty_space_height - large_icon_size) // 2
         
         for i in range(energy_count):
             pos_x = start_x + (i * (symbol_width + gap))
-            draw._image.paste(energy_large_img_copy, (pos_x, symbol_y), energy_large_img_copy)
+            boxes.append(image_box(pos_x, symbol_y, ENERGY_SYMBOL_LARGE, (symbol_width, symbol_width)))
     
-    return current_y + empty_space_height + vertical_spacing
+    return current_y + empty_space_height + vertical_spacing, boxes
 
-def generate_system_icons(draw, system, hull_img, electric_img, life_support_img, current_y):
-    """Generate system icons in the bottom right."""
-    icons = []
+def layout_system_icons(system, tile_width_px, current_y, scale=1.0):
+    """Lay out the band of system icons in the bottom right, returning its box (or None)."""
+    icon_paths = []
     if system.get("hull", False):
-        icons.append(hull_img)
+        icon_paths.append(HULL_ICON)
     if system.get("electronics", False):
-        icons.append(electric_img)
+        icon_paths.append(ELECTRIC_ICON)
     if system.get("life_support", False):
-        icons.append(life_support_img)
+        icon_paths.append(LIFE_SUPPORT_ICON)
     
-    if icons:
-        # Resize icons to a consistent size
-        icon_size = 60  # Target size for icons
-        resized_icons = []
-        for icon in icons:
-            # Create a new image with alpha channel for the resized icon
-            resized_icon = Image.new('RGBA', (icon_size, icon_size), (255, 255, 255, 0))
-            # Calculate position to center the icon
-            x = (icon_size - icon.width) // 2
-            y = (icon_size - icon.height) // 2
-            # Paste the original icon onto the new image
-            resized_icon.paste(icon, (x, y), icon)
-            resized_icons.append(resized_icon)
-        
-        icon_spacing = 10
-        total_width = sum(img.width for img in resized_icons) + (len(resized_icons) - 1) * icon_spacing
-        
-        bg_padding = 10
-        bg_width = total_width + (2 * bg_padding)
-        bg_height = resized_icons[0].height + (2 * bg_padding)
-        
-        bg_x = draw._image.width - bg_width
-        bg_y = current_y - bg_height + 2
-        
-        slope_width = int(bg_height * 0.577)
-        
-        points = [
-            (bg_x, bg_y),
-            (bg_x + bg_width, bg_y),
-            (bg_x + bg_width, bg_y + bg_height),
-            (bg_x - slope_width, bg_y + bg_height),
-            (bg_x, bg_y)
-        ]
-        
-        draw.polygon(points, fill="black")
-        
-        current_x = bg_x + bg_padding
-        for icon in resized_icons:
-            draw._image.paste(icon, (current_x, bg_y + bg_padding), icon)
-            current_x += icon.width + icon_spacing
+    if not icon_paths:
+        return None
     
-    return current_y
-
-def create_system(system, tile_width_px, tile_height_px, dpi):
-    """Create a generic system tile."""
-    # Create canvas with extra height to accommodate all content
-    img = Image.new("RGB", (tile_width_px, tile_height_px * 2), "white")  # Double the height to ensure enough space
-    draw = ImageDraw.Draw(img)
+    icon_size = scaled(60, scale)  # Target size for icons
+    icon_spacing = scaled(10, scale)
+    total_width = len(icon_paths) * icon_size + (len(icon_paths) - 1) * icon_spacing
+    
+    bg_padding = scaled(10, scale)
+    bg_width = total_width + (2 * bg_padding)
+    bg_height = icon_size + (2 * bg_padding)
     
-    # Load resources
-    title_font, subtitle_font, area_title_font, description_font, combat_number_font = load_fonts(dpi, tile_width_px)
-    energy_img, energy_large_img, crew_img, med_bay_img, hull_img, electric_img, life_support_img = load_resource_symbols()
+    bg_x = tile_width_px - bg_width
+    bg_y = current_y - bg_height + scaled(2, scale)
+    
+    slope_width = int(bg_height * 0.577)
+    
+    # Only the icons are cached sprites. Composing the whole band on a layer would paste each icon
+    # onto the layer's opaque background, which lowers the layer alpha along the anti-aliased icon
+    # edges, so the band would no longer match the one drawn straight on the tile
+    band = Box("icons", bg_x - slope_width, bg_y, bg_width + slope_width, bg_height)
+    points = [
+        (slope_width, 0),
+        (slope_width + bg_width, 0),
+        (slope_width + bg_width, bg_height),
+        (0, bg_height),
+        (slope_width, 0)
+    ]
+    band.add(Box("polygon", points=points))
+    
+    current_x = slope_width + bg_padding
+    for icon_path in icon_paths:
+        # Each icon is centered on its own transparent square before being pasted
+        icon = band.add(Box("icon", current_x, bg_padding, icon_size, icon_size, sprite=True, key=(icon_path, scale)))
+        icon.add(image_box(0, 0, icon_path, (icon_size, icon_size)))
+        current_x += icon_size + icon_spacing
+    
+    return band
+
+def layout_system(system, tile_width_px, tile_height_px, dpi):
+    """Lay out a generic system tile without drawing anything.
+
+    Returns a "tile" box whose height is the exact height of the rendered tile. Raises ValueError
+    for tiles narrower than MIN_TILE_WIDTH_PX.
+    """
+    if tile_width_px < MIN_TILE_WIDTH_PX:
+        raise ValueError(f"System tiles must be at least {MIN_TILE_WIDTH_PX}px wide, not {tile_width_px}px")
+    scale = tile_width_px / BASE_TILE_WIDTH_PX
+    tile = Box("tile", 0, 0, tile_width_px, 0, name=system["name"],
+               data={"system": system, "tile_width_px": tile_width_px, "tile_height_px": tile_height_px})
+    
+    # Load fonts
+    with span("load_fonts", system=system["name"]):
+        title_font, subtitle_font, area_title_font, description_font, combat_number_font = load_fonts(dpi, tile_width_px)
     
     # Calculate margins and spacing
     vertical_margin = int(tile_height_px * 0.02)
@@ -485,20 +529,30 @@ def create_system(system, tile_width_px, tile_height_px, dpi):
     if system["name"].lower() == "mess" and "med_bay" in system and system["med_bay"] > 0:
         effective_width = int(tile_width_px * 0.7)  # 70% width for main section
     
-    # Generate title
-    current_y = generate_title(draw, system, title_font, effective_width, vertical_margin)
+    # Title
+    title = tile.add(layout_title(system, title_font, effective_width, vertical_margin))
+    current_y = title.height
     current_y += vertical_spacing
     
-    # Generate rules
-    current_y += generate_rules(draw, system, subtitle_font, effective_width, current_y, vertical_spacing)
+    # Rules
+    rules, rules_height = layout_rules(system, subtitle_font, effective_width, current_y, vertical_spacing)
+    if rules:
+        tile.add(rules)
+    current_y += rules_height
     
     # Handle special systems
-    if system["name"].lower() == "mess":
-        current_y = generate_mess_content(draw, system, title_font, subtitle_font, area_title_font, description_font, med_bay_img, tile_width_px, current_y, vertical_spacing)
-    elif system["name"].lower() == "reactor":
-        current_y = generate_reactor_content(draw, system, energy_large_img, current_y, vertical_spacing)
+    if system["name"].lower() in ["mess", "reactor"]:
+        content_top = current_y
+        if system["name"].lower() == "mess":
+            current_y, boxes = layout_mess_content(system, area_title_font, tile_width_px, current_y, vertical_spacing, scale)
+        else:
+            current_y, boxes = layout_reactor_content(system, tile_width_px, current_y, vertical_spacing, scale)
+        # The content is laid out in tile coordinates, make it relative to its own box
+        for box in boxes:
+            box.y -= content_top
+        tile.add(Box(system["name"].lower(), 0, content_top, tile_width_px, current_y - content_top, children=boxes))
     
-    # Generate areas
+    # Areas
     if "areas" in system and system["areas"]:
         area_margin = int(tile_height_px * 0.02)
         current_y += area_margin
@@ -508,72 +562,139 @@ def create_system(system, tile_width_px, tile_height_px, dpi):
                 divider_y = current_y + vertical_spacing
                 divider_start_x = (tile_width_px - (tile_width_px * 0.5)) // 2
                 divider_end_x = divider_start_x + (tile_width_px * 0.5)
-                draw.line([(divider_start_x, divider_y), 
-                          (divider_end_x, divider_y)], 
-                         fill="black", width=2)
+                tile.add(Box("line", points=[(divider_start_x, divider_y),
+                                             (divider_end_x, divider_y)],
+                             line_width=scaled(2, scale)))
                 current_y = divider_y + vertical_spacing
             
-            cost_column_width = 150
-            content_column_width = tile_width_px - 2 * horizontal_margin - cost_column_width - 20
-            content_x = horizontal_margin + cost_column_width + 20
+            cost_column_width = scaled(150, scale)
+            content_column_width = tile_width_px - 2 * horizontal_margin - cost_column_width - scaled(20, scale)
+            content_x = horizontal_margin + cost_column_width + scaled(20, scale)
             
-            cost_height, cost_img = generate_cost_symbols(draw,
-                                                        area["cost"].get("energy", 0),
-                                                        area["cost"].get("crew", 0),
-                                                        energy_img,
-                                                        crew_img)
+            cost_height, cost_grid = layout_cost_symbols(area["cost"].get("energy", 0),
+                                                         area["cost"].get("crew", 0),
+                                                         scale)
             
-            content_height, content_elements = generate_action(draw, area, content_x,
+            content_height, content_elements = layout_action(area, content_x,
                                                              area_title_font, description_font,
-                                                             vertical_spacing)
+                                                             vertical_spacing, scale)
             
-            min_area_height = 100
+            min_area_height = scaled(100, scale)
             total_height = max(min_area_height, max(cost_height, content_height))
             
             if len(system["areas"]) == 1:
-                total_height = max(total_height, 120)
+                total_height = max(total_height, scaled(120, scale))
             
-            cost_y = current_y + (total_height - cost_height) // 2
-            if cost_img:
-                img.paste(cost_img, (horizontal_margin, cost_y), cost_img)
+            area_box = tile.add(Box("area", 0, current_y, tile_width_px, total_height, name=area.get("name")))
             
-            content_y = current_y + (total_height - content_height) // 2
+            if cost_grid:
+                cost_grid.x = horizontal_margin
+                cost_grid.y = (total_height - cost_height) // 2
+                area_box.add(cost_grid)
+            
+            content_offset = (total_height - content_height) // 2
             for element in content_elements:
-                element_type = element[0]
-                x, y = element[1]
-                content = element[2]
-                if element_type == "text":
-                    font = element[3]
-                    draw.text((x, content_y + y), content, font=font, fill="black")
-                elif element_type == "image":
-                    img.paste(content, (x, content_y + y), content)
+                element.y += content_offset
+                area_box.add(element)
             
             current_y += total_height + vertical_spacing
         
         current_y += area_margin
     elif system["name"].lower() not in ["mess", "reactor"]:
-        min_system_height = 100
+        min_system_height = scaled(100, scale)
         current_y += min_system_height
     
-    # Generate system icons
-    current_y = generate_system_icons(draw, system, hull_img, electric_img, life_support_img, current_y)
+    # System icons
+    icons = layout_system_icons(system, tile_width_px, current_y, scale)
+    if icons:
+        tile.add(icons)
     
     # Add padding at the bottom
     current_y += vertical_margin
     
-    # Draw border
-    draw.rectangle([(0,0), (tile_width_px, current_y)], outline="black", width=8)
+    # Border, the tile is exactly as tall as its content
+    tile.height = current_y
+    tile.add(Box("rect", 0, 0, tile_width_px, current_y, line_width=scaled(8, scale)))
     
-    # Crop to actual content height
-    img = img.crop((0, 0, tile_width_px, current_y))
-    
-    return img
+    return tile
 
-def create_system_image(system, output_folder="systems"):
-    """Create a single system image and return the image object."""
-    tile_width_px = int(round(TILE_WIDTH_CM * DPI / 2.54))
-    tile_height_px = int(round(TILE_HEIGHT_CM * DPI / 2.54))
-    
-    tile_img = create_system(system, tile_width_px, tile_height_px, DPI)
-    
-    return tile_img
\ No newline at end of file
+def create_system(system, tile_width_px, tile_height_px, dpi, mode="RGB"):
+    """Create a generic system tile, laid out and drawn directly at tile_width_px on a canvas of the given mode."""
+    with span("layout_system", system=system["name"]):
+        tile = layout_system(system, tile_width_px, tile_height_px, dpi)
+    return rasterize(tile, mode)
+
+def tile_size(dpi=DPI, target_width=None, scale=None):
+    """Return the (width, height) in pixels of a tile rendered at dpi.
+
+    target_width renders the tile directly at that width, while scale multiplies the nominal
+    8cm width. The height always keeps the 2:1 tile ratio.
+    """
+    if target_width is None and scale is None:
+        return int(round(TILE_WIDTH_CM * dpi / 2.54)), int(round(TILE_HEIGHT_CM * dpi / 2.54))
+    if target_width is None:
+        target_width = int(round(TILE_WIDTH_CM * dpi / 2.54 * scale))
+    return target_width, int(round(target_width * TILE_HEIGHT_CM / TILE_WIDTH_CM))
+
+def tile_params(tile_width_px, tile_height_px, mode="RGB"):
+    """Return the render parameters a tile is cached under, including the tile renderer version.
+
+    The mode is only part of them for grayscale tiles.
+    """
+    params = {"tile_width_px": tile_width_px, "tile_height_px": tile_height_px, "renderer_version": TILE_RENDERER_VERSION}
+    if mode != "RGB":
+        params["mode"] = mode
+    return params
+
+def warm_assets(dpi=DPI, target_width=None, scale=None, mode="RGB"):
+    """Preload every font and icon used to render system tiles at the given size on canvases of the given mode."""
+    tile_width_px, _ = tile_size(dpi, target_width, scale)
+    scale = tile_width_px / BASE_TILE_WIDTH_PX
+    fonts = load_fonts(dpi, tile_width_px)
+    load_resource_symbols(scale, icon_mode(mode))
+    for symbol_path in (ARROW_SYMBOL, ARROW_LONG_SYMBOL, ARROW_EMPTY_SYMBOL):
+        get_icon_by_height(symbol_path, scaled(60, scale), mode=icon_mode(mode))
+    area_title_font = fonts[2]
+    get_font(EUROSTILE_BOLD, int(area_title_font.size * 0.75))
+
+def render_tile(tile, tile_cache=None, mode="RGB"):
+    """Rasterize a tile laid out by layout_system on a canvas of the given mode, going through the TileCache when given."""
+    if tile_cache is not None:
+        cache_key = tile_cache.key(tile.data["system"], **tile_params(tile.data["tile_width_px"], tile.data["tile_height_px"], mode))
+        with span("tile_cache.get", system=tile.name):
+            tile_img = tile_cache.get(cache_key)
+        if tile_img is not None:
+            return tile_img
+    
+    tile_img = rasterize(tile, mode)
+    
+    if tile_cache is not None:
+        with span("tile_cache.put", system=tile.name):
+            tile_cache.put(cache_key, tile_img)
+    
+    return tile_img
+
+def create_system_image(system, output_folder="systems", tile_cache=None, dpi=DPI, target_width=None, scale=None, mode="RGB"):
+    """Create a single system image and return the image object.
+
+    The tile is laid out and drawn directly at its final size: target_width in pixels if given,
+    otherwise 8cm at dpi multiplied by scale, on a canvas of the given mode ("RGB" or "L").
+    When a TileCache is given, previously rendered tiles are loaded from it instead of being
+    drawn again.
+    """
+    tile_width_px, tile_height_px = tile_size(dpi, target_width, scale)
+    
+    if tile_cache is not None:
+        cache_key = tile_cache.key(system, **tile_params(tile_width_px, tile_height_px, mode))
+        with span("tile_cache.get", system=system["name"]):
+            tile_img = tile_cache.get(cache_key)
+        if tile_img is not None:
+            return tile_img
+    
+    tile_img = create_system(system, tile_width_px, tile_height_px, dpi, mode)
+    
+    if tile_cache is not None:
+        with span("tile_cache.put", system=system["name"]):
+            tile_cache.put(cache_key, tile_img)
+    
+    return tile_img
@@ -0,0 +1,136 @@
+import itertools
+import json
+import math
+
+# A template is a ship JSON in which any value can be replaced by a parameter:
+#   {"$range": [2, 5]}             2, 3, 4 and 5 (an optional third item is the step)
+#   {"$choice": ["0-2", "0-3"]}     each listed value
+#   {"$permutations": [1, 1, 0]}    each distinct ordering of the list
+PARAMETER_KEYS = ("$range", "$choice", "$permutations")
+
+def is_parameter(value):
+    """Return whether a template value is a parameter."""
+    return isinstance(value, dict) and len(value) == 1 and next(iter(value)) in PARAMETER_KEYS
+
+class DistinctPermutations:
+    """The distinct orderings of a list, generated one at a time.
+
+    Items are ranked by the position of their first equal item and the ranks are stepped through
+    in lexicographic order (next permutation), so equal items never give the same ordering twice
+    and items need neither be hashable nor comparable.
+    """
+
+    def __init__(self, items):
+        self.items = list(items)
+        self.ranks = sorted(next(j for j, other in enumerate(self.items) if other == item) for item in self.items)
+
+    def count(self):
+        """Return the number of distinct orderings, the multinomial coefficient of the equal items."""
+        count = math.factorial(len(self.ranks))
+        for _, group in itertools.groupby(self.ranks):
+            count //= math.factorial(len(list(group)))
+        return count
+
+    def __iter__(self):
+        ranks = list(self.ranks)
+        while True:
+            yield [self.items[rank] for rank in ranks]
+            # Rightmost rank that is smaller than its successor, or the last ordering was reached
+            i = len(ranks) - 2
+            while i >= 0 and ranks[i] >= ranks[i + 1]:
+                i -= 1
+            if i < 0:
+                return
+            j = len(ranks) - 1
+            while ranks[j] <= ranks[i]:
+                j -= 1
+            ranks[i], ranks[j] = ranks[j], ranks[i]
+            ranks[i + 1:] = reversed(ranks[i + 1:])
+
+def parameter_values(spec):
+    """Return the values a template parameter takes, as a collection that can be iterated again (see value_count)."""
+    kind, args = next(iter(spec.items()))
+    if kind == "$range":
+        start, stop = args[0], args[1]
+        step = args[2] if len(args) > 2 else 1
+        if step == 0:
+            raise ValueError(f"$range step must not be 0: {args}")
+        # Inclusive of the stop value, like the ranges written on the sheets
+        return range(start, stop + (1 if step > 0 else -1), step)
+    if kind == "$choice":
+        return list(args)
+    # Distinct permutations only, so [1, 1, 0] gives 3 variants instead of 6
+    return DistinctPermutations(args)
+
+def find_parameters(value, path=()):
+    """Return the (path, values) of every parameter in a template, in document order.
+
+    Raises ValueError for a parameter in the title, which expand sets itself for each variant.
+    """
+    if is_parameter(value):
+        if path == ("title",):
+            raise ValueError('"title" cannot be a parameter, put "{index}" in it to number the variants instead')
+        return [(path, parameter_values(value))]
+    parameters = []
+    if isinstance(value, dict):
+        for key, item in value.items():
+            parameters.extend(find_parameters(item, path + (key,)))
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            parameters.extend(find_parameters(item, path + (index,)))
+    return parameters
+
+def substitute(value, replacements, path=()):
+    """Return value with the parameter at each path of replacements set to its value.
+
+    Parts of the template without parameters are shared between variants, not copied.
+    """
+    if path in replacements:
+        return replacements[path]
+    if not any(p[:len(path)] == path for p in replacements):
+        return value
+    if isinstance(value, dict):
+        return {key: substitute(item, replacements, path + (key,)) for key, item in value.items()}
+    return [substitute(item, replacements, path + (index,)) for index, item in enumerate(value)]
+
+def path_name(path):
+    """Return a readable name for a parameter path, e.g. sections.left.0.areas.1.shoot.damage."""
+    return ".".join(str(part) for part in path)
+
+def value_count(values):
+    """Return the number of values returned by parameter_values, without generating them."""
+    if isinstance(values, DistinctPermutations):
+        return values.count()
+    return len(values)
+
+def variant_count(template):
+    """Return the number of variants a template expands to, without expanding it."""
+    return math.prod(value_count(values) for _, values in find_parameters(template))
+
+def product(sequences):
+    """Yield every combination of one item of each sequence, like itertools.product but without copying the sequences first."""
+    if not sequences:
+        yield ()
+        return
+    for head in sequences[0]:
+        for tail in product(sequences[1:]):
+            yield (head,) + tail
+
+def expand(template):
+    """Yield (index, parameter values, ship) for every variant of a template, lazily.
+
+    Indices start at 1. The title gets a " v<index>" suffix so each variant has its own sheet,
+    unless it contains "{index}", which is replaced instead.
+    """
+    parameters = find_parameters(template)
+    paths = [path for path, _ in parameters]
+    title = template.get("title", "")
+    for index, combination in enumerate(product([values for _, values in parameters]), 1):
+        replacements = dict(zip(paths, combination))
+        replacements[("title",)] = title.replace("{index}", str(index)) if "{index}" in title else f"{title} v{index}"
+        yield index, {path_name(path): value for path, value in zip(paths, combination)}, substitute(template, replacements)
+
+def load_template(path):
+    """Load a template JSON file."""
+    with open(path, "r") as f:
+        return json.load(f)
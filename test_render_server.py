@@ -0,0 +1,64 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+import pytest
+from render_server import RenderService, RenderRequestHandler, check_ship, check_system
+
+with open("ships/bishok_test.json", "r") as f:
+    SHIP = json.load(f)
+
+@pytest.fixture(scope="module")
+def server_url():
+    service = RenderService(workers=1)
+    handler = type("Handler", (RenderRequestHandler,), {"service": service})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    service.shutdown()
+
+def post(url, payload):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"), method="POST")
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+def test_sample_ship_is_valid():
+    check_ship(SHIP)
+
+@pytest.mark.parametrize("system, field", [
+    ({"name": 1}, "system.name"),
+    ({"name": "Flak", "rules": ["Weapon"]}, "system.rules"),
+    ({"name": "Reactor", "circles": "4"}, "system.circles"),
+    ({"name": "Flak", "areas": {"name": "Salvo"}}, "system.areas"),
+    ({"name": "Flak", "areas": [{"description": "", "cost": {"energy": "1"}}]}, "system.areas.0.cost.energy"),
+])
+def test_wrongly_typed_system_field(system, field):
+    with pytest.raises(ValueError, match=field):
+        check_system(system)
+
+def test_wrongly_typed_ship_field():
+    ship = dict(SHIP, shields={"front": [1, "1"], "rear": []})
+    with pytest.raises(ValueError, match=r"shields\.front\.1"):
+        check_ship(ship)
+
+def test_wrongly_typed_system_is_rejected_with_400(server_url):
+    status, body = post(f"{server_url}/system?dpi=50", {"name": 1})
+    assert status == 400
+    assert "system.name must be a string" in body["error"]
+
+def test_wrongly_typed_ship_is_rejected_with_400(server_url):
+    status, body = post(f"{server_url}/ship?dpi=50", dict(SHIP, sections={"left": "Broadside"}))
+    assert status == 400
+    assert "sections.left must be a list" in body["error"]
+
+def test_system_renders(server_url):
+    status, body = post(f"{server_url}/system?dpi=50", SHIP["reactor"])
+    assert status == 200
+    assert body.startswith(b"\x89PNG")
@@ -0,0 +1,25 @@
+import pytest
+from templates import expand, variant_count
+
+def test_expand_numbers_titles():
+    template = {"title": "Frigate", "shields": {"front": [{"$range": [1, 2]}]}}
+    variants = list(expand(template))
+    assert [ship["title"] for _, _, ship in variants] == ["Frigate v1", "Frigate v2"]
+    assert [params for _, params, _ in variants] == [{"shields.front.0": 1}, {"shields.front.0": 2}]
+
+def test_expand_replaces_index_placeholder():
+    template = {"title": "Frigate {index}", "reactor": {"circles": {"$choice": [2, 3]}}}
+    assert [ship["title"] for _, _, ship in expand(template)] == ["Frigate 1", "Frigate 2"]
+
+def test_permutations_are_distinct():
+    template = {"title": "Frigate", "shields": {"front": {"$permutations": [1, 1, 0]}}}
+    assert variant_count(template) == 3
+    assert [ship["shields"]["front"] for _, _, ship in expand(template)] == [[1, 1, 0], [1, 0, 1], [0, 1, 1]]
+
+@pytest.mark.parametrize("title", [{"$choice": ["A", "B"]}, {"$range": [1, 3]}])
+def test_title_parameter_is_rejected(title):
+    template = {"title": title, "reactor": {"circles": {"$range": [2, 3]}}}
+    with pytest.raises(ValueError, match='"title"'):
+        next(expand(template))
+    with pytest.raises(ValueError, match='"title"'):
+        variant_count(template)
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from PIL import Image
+from assets import asset_fingerprint
+
+DEFAULT_CACHE_DIR = ".tile_cache"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024  # 256MB
+EVICTION_INTERVAL = 64  # Number of stores between two eviction scans
+
+def system_hash(system, **params):
+    """Return a canonical hash of a system dict and the parameters it is rendered with."""
+    payload = json.dumps({"system": system, "params": params},
+                         sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class TileCache:
+    """Content-addressed on-disk cache of rendered system tiles.
+
+    Tiles are stored as PNG files named after the hash of the system dict, the render
+    parameters and the font and resource files. Files are written atomically, so several
+    processes can share the same cache directory. Least recently used tiles are evicted
+    once the cache grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._stores = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, system, **params):
+        """Return the cache key of a system rendered with the given parameters."""
+        return system_hash(system, assets=asset_fingerprint(), **params)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.png")
+
+    def get(self, key):
+        """Return the cached tile for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            with Image.open(path) as img:
+                img.load()
+            # Refresh the modification time, it is the LRU timestamp used for eviction
+            os.utime(path)
+        except (OSError, SyntaxError):
+            # Missing, evicted by another process or truncated file
+            self.misses += 1
+            return None
+        self.hits += 1
+        return img
+
+    def put(self, key, img):
+        """Store a rendered tile under key."""
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        # Write to a temporary file first and rename it, so readers never see partial tiles
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                img.save(f, format="PNG", compress_level=1)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        self._stores += 1
+        if self._stores % EVICTION_INTERVAL == 1:
+            self.evict()
+
+    def evict(self):
+        """Delete least recently used tiles until the cache fits in max_bytes."""
+        entries = []
+        total_size = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".png"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total_size += st.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Already evicted by another process
+                pass
+            total_size -= size
+
+    def clear(self):
+        """Delete every cached tile."""
+        max_bytes, self.max_bytes = self.max_bytes, 0
+        self.evict()
+        self.max_bytes = max_bytes
+
+class MemoryTileCache:
+    """In-memory LRU of rendered tiles, optionally in front of an on-disk TileCache.
+
+    Identical systems (same JSON and render size) hash to the same key, so a batch where many
+    ships share systems, such as template variants, renders each distinct tile once. At most
+    max_entries tiles are kept in memory.
+    """
+
+    def __init__(self, max_entries=128, backing=None):
+        self.max_entries = max_entries
+        self.backing = backing
+        self.hits = 0
+        self.misses = 0
+        self._tiles = OrderedDict()
+
+    def key(self, system, **params):
+        """Return the cache key of a system rendered with the given parameters."""
+        if self.backing is not None:
+            return self.backing.key(system, **params)
+        return system_hash(system, **params)
+
+    def get(self, key):
+        """Return the tile for key from memory or the backing cache, or None on a miss."""
+        img = self._tiles.get(key)
+        if img is not None:
+            self._tiles.move_to_end(key)
+            self.hits += 1
+            return img
+        if self.backing is not None:
+            img = self.backing.get(key)
+            if img is not None:
+                self._store(key, img)
+                self.hits += 1
+                return img
+        self.misses += 1
+        return None
+
+    def _store(self, key, img):
+        self._tiles[key] = img
+        if len(self._tiles) > self.max_entries:
+            self._tiles.popitem(last=False)
+
+    def put(self, key, img):
+        """Store a rendered tile under key, in memory and in the backing cache."""
+        self._store(key, img)
+        if self.backing is not None:
+            self.backing.put(key, img)
+
+    def evict(self):
+        """Evict the backing cache down to its size limit."""
+        if self.backing is not None:
+            self.backing.evict()
@@ -0,0 +1,150 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from multiprocessing.reduction import ForkingPickler
+from PIL import Image, ImageDraw, ImageFont
+from assets import get_font
+from layout import draw_box, find_boxes
+from system import render_tile, tile_params
+from tile_cache import TileCache, MemoryTileCache, system_hash
+import tracing
+from tracing import span
+
+# Pixel layout of the shared canvas for each sheet mode: one Pillow can map without copying
+_BUFFER_MODES = {"RGB": "RGBX", "L": "L"}
+_BYTES_PER_PIXEL = {"RGBX": 4, "L": 1}
+
+# Tile cache of the current worker process, see _init_worker
+_worker_tile_cache = None
+
+def _reduce_font(font):
+    """Send registry fonts to the workers by path and size, so they reuse their own loaded copy."""
+    if isinstance(font.path, str):
+        return get_font, (font.path, font.size)
+    return font.__reduce_ex__(2)
+
+ForkingPickler.register(ImageFont.FreeTypeFont, _reduce_font)
+
+def _init_worker(tile_cache_dir, tile_cache_max_bytes, dpi, mode, trace=False, memory_tiles=0):
+    """Set up a tile worker process: warm its fonts and icons and open the tile caches."""
+    global _worker_tile_cache
+    from ship_creator import warm_assets
+
+    if trace:
+        tracing.enable()
+    with span("warm_assets"):
+        warm_assets(dpi, mode)
+    if tile_cache_dir:
+        _worker_tile_cache = TileCache(tile_cache_dir, max_bytes=tile_cache_max_bytes)
+    if memory_tiles:
+        _worker_tile_cache = MemoryTileCache(memory_tiles, backing=_worker_tile_cache)
+
+def _render_into(buffer_name, sheet_size, buffer_mode, mode, tile, region):
+    """Rasterize a tile laid out by the parent in a worker and copy its pixels into region of the shared sheet canvas.
+
+    Returns the tile cache hits and misses of the tile and the trace events of the worker.
+    """
+    cache = _worker_tile_cache
+    hits, misses = (cache.hits, cache.misses) if cache else (0, 0)
+    tile_img = render_tile(tile, cache, mode)
+
+    left, top, right, bottom = region
+    pixel_bytes = _BYTES_PER_PIXEL[buffer_mode]
+    with span("copy_to_shared", system=tile.name):
+        # Clip the tile to the sheet, like a paste would
+        x0, y0 = max(left, 0), max(top, 0)
+        x1, y1 = min(right, sheet_size[0]), min(bottom, sheet_size[1])
+        pixels = memoryview(tile_img.tobytes("raw", buffer_mode))
+        row_bytes = tile_img.width * pixel_bytes
+        # Workers share the resource tracker of the parent, which owns and unlinks the segment
+        segment = shared_memory.SharedMemory(name=buffer_name)
+        try:
+            for y in range(y0, y1):
+                start = (y * sheet_size[0] + x0) * pixel_bytes
+                offset = (y - top) * row_bytes + (x0 - left) * pixel_bytes
+                segment.buf[start:start + (x1 - x0) * pixel_bytes] = pixels[offset:offset + (x1 - x0) * pixel_bytes]
+        finally:
+            segment.close()
+    if cache:
+        hits, misses = cache.hits - hits, cache.misses - misses
+    return hits, misses, tracing.collect()
+
+def _on_sheet(region, size):
+    left, top, right, bottom = region
+    return left >= 0 and top >= 0 and right <= size[0] and bottom <= size[1]
+
+class TilePool:
+    """Worker processes drawing the system tiles of one sheet at a time, in parallel.
+
+    Each distinct tile of the sheet (by system and size) is sent once, as laid out by the parent,
+    to a worker that rasterizes it and writes the pixels straight into the tile's region of a
+    shared memory canvas of the sheet size, so no tile image is pickled back. With
+    memory_tiles, each worker keeps that many rendered tiles in memory. The parent meanwhile draws the title, labels and shield box and pastes each tile from the
+    shared canvas (mapped with Image.frombuffer) in the usual drawing order, so the sheet is
+    identical to a serial render.
+    """
+
+    def __init__(self, workers, dpi, mode="RGB", tile_cache=None, memory_tiles=0):
+        self.dpi = dpi
+        self.hits = 0
+        self.misses = 0
+        cache_dir = tile_cache.cache_dir if tile_cache else None
+        cache_max_bytes = tile_cache.max_bytes if tile_cache else 0
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                            initargs=(cache_dir, cache_max_bytes, dpi, mode, tracing.enabled(), memory_tiles))
+
+    def render_sheet(self, sheet, mode="RGB"):
+        """Rasterize a ship sheet laid out by layout_ship_sheet, drawing its tiles in the workers."""
+        size = (int(sheet.width), int(sheet.height))
+        buffer_mode = _BUFFER_MODES[mode]
+        segment = shared_memory.SharedMemory(create=True, size=size[0] * size[1] * _BYTES_PER_PIXEL[buffer_mode])
+        shared = None
+        jobs = {}  # Future and region of each distinct tile, by system hash
+        try:
+            placements = {}  # System hash of each tile box, by id
+            drawn = {}  # Tile box and region drawn for each system hash
+            for tile, x, y in find_boxes(sheet, "tile"):
+                key = system_hash(tile.data["system"], **tile_params(tile.data["tile_width_px"], tile.data["tile_height_px"], mode))
+                placements[id(tile)] = key
+                region = (int(x), int(y), int(x) + int(tile.width), int(y) + int(tile.height))
+                # Draw a copy lying wholly on the sheet when there is one, so every copy can be cropped from it
+                if key not in drawn or not _on_sheet(drawn[key][1], size) and _on_sheet(region, size):
+                    drawn[key] = (tile, region)
+            for key, (tile, region) in drawn.items():
+                future = self.executor.submit(_render_into, segment.name, size, buffer_mode, mode, tile, region)
+                jobs[key] = (future, region)
+            shared = Image.frombuffer(buffer_mode, size, segment.buf, "raw", buffer_mode, 0, 1)
+            collected = set()
+
+            def paste_tile(tile):
+                key = placements[id(tile)]
+                future, region = jobs[key]
+                if key not in collected:
+                    with span("wait_tile", system=tile.name):
+                        hits, misses, events = future.result()
+                    tracing.add_events(events)
+                    self.hits += hits
+                    self.misses += misses
+                    collected.add(key)
+                return shared.crop(region)
+
+            with span("rasterize", kind=sheet.kind, name=sheet.name):
+                img = Image.new(mode, size, "white")
+                draw = ImageDraw.Draw(img)
+                for child in sheet.children:
+                    draw_box(img, draw, child, 0, 0, render_tile=paste_tile)
+        finally:
+            for future, _ in jobs.values():
+                future.cancel()
+            for future, _ in jobs.values():
+                if not future.cancelled():
+                    # Never free the canvas while a worker may still be writing into it
+                    future.exception()
+            # The mapped image must let go of the buffer before the segment can be closed
+            del shared
+            segment.close()
+            segment.unlink()
+        return img
+
+    def close(self):
+        """Stop the worker processes."""
+        self.executor.shutdown(cancel_futures=True)
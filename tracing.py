@@ -0,0 +1,85 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+# Recorded trace events, or None while tracing is off
+_events = None
+_lock = threading.Lock()
+_NULL_SPAN = contextlib.nullcontext()
+
+class _Span:
+    """Context manager recording one complete ("X") trace event."""
+    __slots__ = ("name", "category", "args", "start")
+
+    def __init__(self, name, category, args):
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        event = {
+            "name": self.name,
+            "cat": self.category,
+            "ph": "X",
+            "ts": self.start / 1000,
+            "dur": (end - self.start) / 1000,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+        }
+        if self.args:
+            event["args"] = self.args
+        with _lock:
+            if _events is not None:
+                _events.append(event)
+        return False
+
+def enable():
+    """Start recording trace events in this process."""
+    global _events
+    with _lock:
+        if _events is None:
+            _events = []
+
+def enabled():
+    """Return whether trace events are being recorded."""
+    return _events is not None
+
+def span(stage, category="render", **args):
+    """Return a context manager timing a stage, tagged with args (such as ship or system names).
+
+    While tracing is off this returns a shared no-op context, so spans cost a single call.
+    """
+    if _events is None:
+        return _NULL_SPAN
+    return _Span(stage, category, args)
+
+def collect():
+    """Return and forget the events recorded so far, e.g. to send them from a worker process."""
+    global _events
+    with _lock:
+        if _events is None:
+            return []
+        events, _events = _events, []
+    return events
+
+def add_events(events):
+    """Merge events recorded by another process."""
+    with _lock:
+        if _events is not None:
+            _events.extend(events)
+
+def write(path):
+    """Write the recorded events as a Chrome trace (open in Perfetto or chrome://tracing)."""
+    with _lock:
+        events = list(_events or [])
+    # perf_counter is system-wide on Linux, so events from worker processes share one timeline
+    events.sort(key=lambda event: event["ts"])
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
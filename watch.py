@@ -0,0 +1,165 @@
+import json
+import os
+import time
+from PIL import Image, ImageDraw
+from layout import draw_box, canvas_mode, QUARTER_TURNS
+from system import render_tile
+from tile_cache import MemoryTileCache
+from ship_creator import layout_ship_sheet, render_ship_sheet, ship_output_path, sheet_outputs, save_sheet, DPI
+
+POLL_INTERVAL = 0.25  # Seconds between two checks of the watched files
+REDRAW_MARGIN_PX = 2  # Margin around the ink of a changed part, covering antialiasing
+WATCH_TILES = 64  # Rendered tiles kept in memory per watched sheet
+
+class WatchedSheet:
+    """The last layout and image of a ship sheet, updated in place when its JSON changes.
+
+    Only the top-level regions of the sheet (header, column, Reactor/Mess or shield box) whose
+    layout changed are drawn again, and only the tiles whose system changed are rasterized:
+    the others come from an in-memory tile cache.
+    """
+
+    def __init__(self, json_path, output_dir, dpi=DPI, output_format="jpg", encoder=None, tile_cache=None, pyramid=(),
+                 color_mode="RGB"):
+        self.json_path = json_path
+        self.output_dir = output_dir
+        self.dpi = dpi
+        self.output_format = output_format
+        self.encoder = encoder
+        self.pyramid = pyramid
+        self.color_mode = color_mode
+        self.tiles = MemoryTileCache(WATCH_TILES, backing=tile_cache)
+        self.mtime = None
+        self.ship_data = None
+        self.sheet = None
+        self.img = None
+        self.output_path = None
+
+    def changed(self):
+        """Return whether the JSON file was modified since it was last loaded."""
+        return os.stat(self.json_path).st_mtime_ns != self.mtime
+
+    def update(self):
+        """Reload the JSON and redraw what changed, returning a short description of the work done."""
+        self.mtime = os.stat(self.json_path).st_mtime_ns
+        with open(self.json_path, "r") as f:
+            ship_data = json.load(f)
+        if ship_data == self.ship_data:
+            return None
+        misses = self.tiles.misses
+        sheet = layout_ship_sheet(ship_data, self.dpi)
+
+        if self.img is None:
+            self.img = render_ship_sheet(sheet, self.tiles, canvas_mode(self.color_mode))
+            redrawn = "full sheet drawn"
+        else:
+            # Top-level parts compare equal when their whole layout, down to the system JSON of each tile, is unchanged
+            changed = [(old, new) for old, new in zip(self.sheet.children, sheet.children) if old != new]
+            dirty = [ink_bounds(old) for old, _ in changed] + [ink_bounds(new) for _, new in changed]
+            for region in _merge(dirty):
+                self._redraw(sheet, region)
+            redrawn = f"{len(changed)} of {len(sheet.children)} parts redrawn"
+
+        output_path = ship_output_path(ship_data, self.output_dir, self.output_format)
+        save_sheet(self.img, sheet_outputs(output_path, self.dpi, self.pyramid), self.encoder, color_mode=self.color_mode)
+        if self.output_path is not None and output_path != self.output_path:
+            # The title changed, so the sheet moved to a new file
+            for _, path, _ in sheet_outputs(self.output_path, self.dpi, self.pyramid):
+                if os.path.exists(path):
+                    os.remove(path)
+        self.ship_data, self.sheet, self.output_path = ship_data, sheet, output_path
+        return f"{redrawn}, {self.tiles.misses - misses} tiles rendered"
+
+    def _redraw(self, sheet, region):
+        # Draw every part of the sheet reaching into the region on a blank canvas of its size, then paste it
+        left, top = max(region[0], 0), max(region[1], 0)
+        right, bottom = min(region[2], sheet.width), min(region[3], sheet.height)
+        if right <= left or bottom <= top:
+            return
+        canvas = Image.new(self.img.mode, (right - left, bottom - top), "white")
+        draw = ImageDraw.Draw(canvas)
+        for child in sheet.children:
+            if _overlaps(ink_bounds(child), (left, top, right, bottom)):
+                draw_box(canvas, draw, child, -left, -top, render_tile=lambda tile: render_tile(tile, self.tiles, canvas.mode))
+        self.img.paste(canvas, (left, top))
+
+# Only used to measure text
+_measure_draw = ImageDraw.Draw(Image.new("L", (1, 1)))
+
+def ink_bounds(box, x=0, y=0):
+    """Return the (left, top, right, bottom) pixels that drawing box at (x, y) can touch.
+
+    Text is measured from its glyphs, which reach past the measured size of a text box
+    (ascender offset, descenders), and a margin of REDRAW_MARGIN_PX covers antialiasing.
+    """
+    x += box.x
+    y += box.y
+    if box.kind == "text":
+        bounds = [_measure_draw.textbbox((x, y), box.text, font=box.font)]
+    elif box.kind in ("line", "polygon"):
+        xs = [px + x for px, _ in box.points]
+        ys = [py + y for _, py in box.points]
+        half = box.line_width / 2
+        bounds = [(min(xs) - half, min(ys) - half, max(xs) + half, max(ys) + half)]
+    elif box.sprite and box.rotate in QUARTER_TURNS:
+        bounds = [(x, y, x + box.height, y + box.width)]
+    else:
+        bounds = [(x, y, x + box.width + box.line_width, y + box.height + box.line_width)]
+    if box.kind != "tile" and not box.sprite:
+        # Tiles and sprites are drawn on their own canvas, so their content never spills out of them
+        bounds += [ink_bounds(child, x, y) for child in box.children]
+    return (int(min(b[0] for b in bounds)) - REDRAW_MARGIN_PX, int(min(b[1] for b in bounds)) - REDRAW_MARGIN_PX,
+            int(max(b[2] for b in bounds)) + REDRAW_MARGIN_PX + 1, int(max(b[3] for b in bounds)) + REDRAW_MARGIN_PX + 1)
+
+def _overlaps(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+def _merge(regions):
+    """Merge overlapping (left, top, right, bottom) regions so no pixel is drawn twice."""
+    merged = []
+    for region in regions:
+        while True:
+            overlapping = [other for other in merged if _overlaps(other, region)]
+            if not overlapping:
+                break
+            for other in overlapping:
+                merged.remove(other)
+                region = (min(region[0], other[0]), min(region[1], other[1]),
+                          max(region[2], other[2]), max(region[3], other[3]))
+        merged.append(region)
+    return merged
+
+def watch_ships(json_paths, output_dir, dpi=DPI, output_format="jpg", encoder=None, tile_cache=None, pyramid=(),
+                color_mode="RGB", poll_interval=POLL_INTERVAL):
+    """Render the given ships, then keep re-rendering each one whenever its JSON file changes, until interrupted.
+
+    json_paths is called on every poll, so ships added to (or removed from) a directory are
+    picked up. A file that cannot be read, for example while it is being saved, keeps its last
+    sheet until the next change.
+    """
+    watched = {}
+    print("Watching for changes, press Ctrl+C to stop")
+    try:
+        while True:
+            paths = json_paths()
+            for path in list(watched):
+                if path not in paths:
+                    del watched[path]
+            for path in paths:
+                sheet = watched.get(path)
+                if sheet is None:
+                    sheet = watched[path] = WatchedSheet(path, output_dir, dpi, output_format, encoder, tile_cache, pyramid,
+                                                         color_mode)
+                try:
+                    if not sheet.changed():
+                        continue
+                    start = time.perf_counter()
+                    summary = sheet.update()
+                except Exception as e:
+                    print(f"Error processing {path}: {str(e)}")
+                    continue
+                if summary is not None:
+                    print(f"Saved ship sheet to: {sheet.output_path} ({summary} in {(time.perf_counter() - start) * 1000:.0f}ms)")
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        print("Stopped watching")